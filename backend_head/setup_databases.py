@@ -7,6 +7,8 @@ from gm_services.database.tablestore.pg_creation import (
     create_position_table,
     create_user_position_table
 )
+import os
+import httpx
 from src.head import HEAD
 from gm_services.config import Settings
 
@@ -91,6 +93,27 @@ def setup_tablebase() -> None:
     else:
         logger.info("User's position table was not created")
 
+    # Tables could be changed, cached users must be read again
+    invalidate_server_cache()
+
+
+def invalidate_server_cache() -> None:
+    """Drop tablestore cache of the running backend, it has its own one in its process"""
+    host = Settings.api.main_back.host
+    if host == "0.0.0.0":
+        host = "localhost"
+
+    try:
+        r = httpx.get(
+            f"http://{host}:{Settings.api.main_back.port}/cache/invalidate",
+            headers = {"X-Admin-Token": os.environ.get("BACKEND_ADMIN_TOKEN", "")}
+        )
+        r.raise_for_status()
+        logger.info("Tablestore cache of the backend was invalidated")
+    except httpx.HTTPError as err:
+        # Backend that is not running will read the tables on start anyway
+        logger.warning("Tablestore cache of the backend was not invalidated: %s", err)
+
 
 def main(mode: Literal["all", "vectorbase", "tablebase"]) -> None:
     if mode in ["all", "vectorbase"]:
@@ -1,16 +1,27 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 
 from .routes.ws_handle.ws_api import websocket_router
 from .routes.files_interaction import file_router
 from .routes.chats import chats_router
 from .routes.plibrary import plibrary_router
+from .routes.cache import cache_router
+from gm_services.database.vectorstore.osdb_pool import close_async_opensearch_client
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release connections of the shared AsyncOpenSearch client
+    await close_async_opensearch_client()
+
+
+app = FastAPI(lifespan = lifespan)
 app.include_router(file_router)
 app.include_router(chats_router)
 app.include_router(plibrary_router)
+app.include_router(cache_router)
 app.include_router(websocket_router)
 
 #-------------------------------------------
@@ -0,0 +1,53 @@
+import os
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException
+from ...head import HEAD
+
+# In-process caches of the backend router
+cache_router = APIRouter()
+
+# -----------------------------
+# Hit/miss counters of caches
+# -----------------------------
+@cache_router.get("/cache/stats")
+async def get_cache_stats() -> dict[str, dict]:
+    """
+    Returns
+    -------
+    stats: dict[str, dict]
+        Stats has this structure:
+        ```json
+        {
+            "tablestore": {
+                "users": {"hits": int, "misses": int, ...},
+                "positions": {...},
+                "credentials": {...}
+            },
+            "history": {"hits": int, "misses": int, ...}
+        }
+        ```
+    """
+    return {
+        "tablestore": HEAD.get_tablestore_cache_stats(),
+        "history": HEAD.get_history_cache_stats()
+    }
+
+
+# ------------------------------------------------
+# Drop cached users after tables were loaded again
+# ------------------------------------------------
+def check_admin_token(x_admin_token: str | None = Header(default = None)) -> None:
+    """
+    Only clients that know `BACKEND_ADMIN_TOKEN` of the backend environment
+    (e.g. `setup_databases.py` with the same `.env`) may drop the caches.
+    Nobody may do it when the token is not set.
+    """
+    token = os.environ.get("BACKEND_ADMIN_TOKEN")
+    if not token or x_admin_token is None or not secrets.compare_digest(x_admin_token, token):
+        raise HTTPException(status_code = 403, detail = "Admin token is missing or wrong")
+
+
+@cache_router.get("/cache/invalidate", dependencies = [Depends(check_admin_token)])
+async def invalidate_cache() -> dict[str, str]:
+    HEAD.invalidate_tablestore_cache()
+    return {"message": "Tablestore cache was invalidated"}
@@ -9,7 +9,7 @@ chats_router = APIRouter()
 # --------------------
 @chats_router.get("/chat/add")
 async def add_chat_list(user_id: str, session_id: str, chat_name: str) -> dict[str, str]:
-    HEAD.add_chat_id(user_id, session_id, chat_name)
+    await HEAD.add_chat_id(user_id, session_id, chat_name)
 
     return {"message": f"Chat {session_id} with name {chat_name} was added"}
 
@@ -19,7 +19,7 @@ async def add_chat_list(user_id: str, session_id: str, chat_name: str) -> dict[s
 # -----------
 @chats_router.get("/chat/delete")
 async def delete_chat_list(session_id: str) -> dict:
-    HEAD.delete_chat_id(session_id)
+    await HEAD.delete_chat_id(session_id)
 
     return {"message": f"Chat {session_id} was deleted"}
 
@@ -49,7 +49,7 @@ async def get_chat_history(session_id: str) -> dict[str, list[dict]]:
         ```
     """
     # Get the full history
-    messages = HEAD.get_messages(session_id, mode = "api")
+    messages = await HEAD.get_messages(session_id, mode = "api")
 
     return {"history": messages}
 
@@ -75,7 +75,7 @@ async def get_chat_list(user_id: str) -> dict[str, list[dict]]:
         }
         ```
     """
-    chat_list = HEAD.get_chat_ids(user_id)
+    chat_list = await HEAD.get_chat_ids(user_id)
 
     return {"chat_list": chat_list}
 
@@ -85,5 +85,5 @@ async def get_chat_list(user_id: str) -> dict[str, list[dict]]:
 # ------------------
 @chats_router.get("/chat/update")
 async def update_chat(session_id: str, session_name: str) -> dict[str, str]:
-    HEAD.update_chat_id(session_id, session_name)
+    await HEAD.update_chat_id(session_id, session_name)
     return {"message": f"Chat's name of {session_id} was updated"}
\ No newline at end of file
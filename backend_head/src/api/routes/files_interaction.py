@@ -24,19 +24,28 @@ async def download_file(filename: str) -> FileResponse:
     )
 
 
+class FAILED_FILE(TypedDict):
+    filename: str
+    error: str
+
 class UPLOAD_FILES_RETURN(TypedDict):
     uploaded: list[str]
+    failed: list[FAILED_FILE]
 
 @file_router.post("/upload")
 async def upload_files(
     user_id: str,
     files: list[UploadFile] = File(...)
 ) -> UPLOAD_FILES_RETURN:
-    await HEAD.files_upload(
+    results = await HEAD.files_upload(
         files = files, 
         user_id = user_id, 
         session_id = DOCUMENT_SESSION_ID_PLACEHOLDER
     )
 
-    saved_files = [file.filename for file in files]
-    return {"uploaded": saved_files}
\ No newline at end of file
+    saved_files = [result.filename for result in results if result.uploaded]
+    failed_files = [
+        {"filename": result.filename, "error": result.error}
+        for result in results if not result.uploaded
+    ]
+    return {"uploaded": saved_files, "failed": failed_files}
\ No newline at end of file
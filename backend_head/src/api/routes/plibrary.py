@@ -9,7 +9,7 @@ plibrary_router = APIRouter()
 # --------------------------------
 @plibrary_router.get("/plibrary/add")
 async def add_prompt_to_library(user_id: str, prompt: str, name: str) -> dict[str, str]:
-    prompt_id = HEAD.add_prompt_library(user_id, prompt, name)
+    prompt_id = await HEAD.add_prompt_library(user_id, prompt, name)
 
     return {
         "message": f"Prompt {prompt_id} with name {name} was added",
@@ -22,7 +22,7 @@ async def add_prompt_to_library(user_id: str, prompt: str, name: str) -> dict[st
 # ----------------------------------------
 @plibrary_router.get("/plibrary/update")
 async def update_prompt_to_library(prompt_id: str, prompt: str, name: str) -> dict[str, str]:
-    prompt_id = HEAD.update_prompt_library(prompt_id, prompt, name)
+    prompt_id = await HEAD.update_prompt_library(prompt_id, prompt, name)
 
     return {"message": f"Prompt {prompt_id} was updated"}
 
@@ -32,7 +32,7 @@ async def update_prompt_to_library(prompt_id: str, prompt: str, name: str) -> di
 # --------------------------
 @plibrary_router.get("/plibrary/delete")
 async def delete_prompt_in_library(prompt_id: str) -> dict[str, str]:
-    HEAD.delete_prompt_library(prompt_id)
+    await HEAD.delete_prompt_library(prompt_id)
 
     return {"message": f"Prompt {prompt_id} was deleted"}
 
@@ -60,6 +60,6 @@ async def get_prompt_library(user_id: str) -> dict[str, list[dict[str, str]]]:
         }
         ```
     """
-    prompt_library = HEAD.get_prompt_library(user_id)
+    prompt_library = await HEAD.get_prompt_library(user_id)
 
     return {"prompt_library": prompt_library}
\ No newline at end of file
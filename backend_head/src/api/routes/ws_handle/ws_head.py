@@ -100,7 +100,7 @@ class WSHead:
         documents_view_dict = documents_view.to_dict()
         
         # Save what we extracted
-        HEAD.add_extracted_info(self.session_id, documents_view)
+        await HEAD.add_extracted_info(self.session_id, documents_view)
 
         # Delete unnecessary for now parameters
         del documents_view_dict["text"]
@@ -129,7 +129,7 @@ class WSHead:
         await self._send_new_message(WAIT_FOR_DOCUMENT_PREPARATION)
 
         # Formalize
-        filename = HEAD.formalize(self.session_id, self.user_id, message_id)
+        filename = await HEAD.formalize(self.session_id, self.user_id, message_id)
         chunk = {
             "event": EVENT_SEND_FILENAME_FOR_DOWNLOAD, 
             "name": Settings.web.run_name,
@@ -138,11 +138,12 @@ class WSHead:
         await self.websocket.send_json(chunk)
 
     
-    def _set_runnable_chain(self) -> None:
+    async def _set_runnable_chain(self) -> None:
         """Define and prepare runnable for a new run"""
         # If there is an extracted info - we have a scenario with mail
         # otherwise - we use default scenario (mainly QA)
-        if HEAD.get_extracted_info(self.session_id) is None:
+        extracted_info = await HEAD.get_extracted_info(self.session_id)
+        if extracted_info is None:
             mode = "default"
             # Helper for tool calling
             if Settings.models.tools:
@@ -167,7 +168,7 @@ class WSHead:
             # Prepare runnable for generating part
             self.runnable = HEAD.create_runnable_chain(
                 mode = mode,
-                context = HEAD.get_extracted_info(self.session_id),
+                context = extracted_info,
                 tools = need_tools
             )
     
@@ -300,11 +301,11 @@ class WSHead:
             "event": EVENT_GENERATION_END,
             "run_id": chunk["run_id"],
             "name": Settings.web.run_name,
-            "message_id": HEAD.get_last_message_id(self.session_id)
+            "message_id": await HEAD.get_last_message_id(self.session_id)
         })
     
 
-    def _update_rating(
+    async def _update_rating(
         self, 
         message_id: str, 
         rating: RATING_TYPE | None
@@ -323,7 +324,7 @@ class WSHead:
                 pass
         
         # Update rating value
-        HEAD.update_langchain_message(
+        await HEAD.update_langchain_message(
             message_id = message_id, 
             parameter_name = "rating",
             parameter_value = rating_int
@@ -341,7 +342,7 @@ class WSHead:
         is_check_fine: bool
             `True`, if user was found and password is legit. `False` otherwise.
         """
-        user = HEAD.find_user(user_id)
+        user = await HEAD.find_user(user_id)
         
         # Send error message if we didn't find the user by login
         if user is None:
@@ -354,7 +355,7 @@ class WSHead:
         
         else:
             # Check password
-            is_check_fine = HEAD.check_password(user.key_id, password)
+            is_check_fine = await HEAD.check_password(user.key_id, password)
 
             if is_check_fine:
                 self.user_id = user.key_id
@@ -394,7 +395,7 @@ class WSHead:
         """Load previos chat and send old chat history to frontend"""
         self._update_conversation(session_id)
 
-        messages = HEAD.get_messages(self.session_id, mode = "api")
+        messages = await HEAD.get_messages(self.session_id, mode = "api")
         await self.websocket.send_json({
             "event": EVENT_SEND_PREVIOUS_CHAT_HISTORY,
             "session_id": self.session_id,
@@ -407,7 +408,7 @@ class WSHead:
     async def create_conversation(self) -> None:
         """Create new conversation (chat) with user"""
         session_id = generate_hex()
-        HEAD.add_chat_id(self.user_id, session_id)
+        await HEAD.add_chat_id(self.user_id, session_id)
 
         self._update_conversation(session_id)
 
@@ -430,9 +431,9 @@ class WSHead:
             case "SUMMARY":
                 # If self.session_id is None - there is no active conversation
                 if self.session_id is None:
-                    self.create_conversation()
+                    await self.create_conversation()
                 # Replace session_id placeholder of new uploaded documents with a real value
-                HEAD.remove_document_session_id_placeholder(
+                await HEAD.remove_document_session_id_placeholder(
                     user_id = self.user_id,
                     session_id = self.session_id
                 )
@@ -441,8 +442,8 @@ class WSHead:
             case "QUERY":
                 # If self.session_id is None - there is no active conversation
                 if self.session_id is None:
-                    self.create_conversation()
-                self._set_runnable_chain()
+                    await self.create_conversation()
+                await self._set_runnable_chain()
                 message = data["message"]
                 await self._run_generation(message)
 
@@ -460,4 +461,4 @@ class WSHead:
             case "RATE":
                 message_id = data["message_id"]
                 rating = data.get("rating", None)
-                self._update_rating(message_id, rating)
\ No newline at end of file
+                await self._update_rating(message_id, rating)
\ No newline at end of file
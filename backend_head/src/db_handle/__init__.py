@@ -1,5 +1,8 @@
 from . import osdb_chat
+from . import osdb_chat_async
 from . import langchain_chat_history
 from . import history
+from . import history_cache
 
-from osdb_chat import OpenSearchChatHandler
\ No newline at end of file
+from .osdb_chat import OpenSearchChatHandler
+from .osdb_chat_async import AsyncOpenSearchChatHandler
\ No newline at end of file
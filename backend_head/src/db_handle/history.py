@@ -1,59 +1,188 @@
 import json
 from time import time
-from langchain_core.messages import message_to_dict
+from langchain_core.messages import message_to_dict, messages_from_dict
 
 from .langchain_chat_history import OpenSearchChatMessageHistory
-from gm_services.database.vectorstore import OpenSearchConnection
+from .history_cache import MESSAGE_HISTORY_CACHE, PENDING_WRITES
+from gm_services.database.vectorstore import get_opensearch_client
 from gm_services.config import Settings
 
+from opensearchpy import OpenSearch, AsyncOpenSearch
 from langchain_core.messages import BaseMessage
+from typing import Any
 
 import logging
 logger = logging.getLogger(__name__)
 
 
+# Value of `refresh` parameter of index request for every history write mode
+REFRESH_BY_WRITE_MODE = {
+    "none": False,
+    "wait_for": "wait_for",
+    "force": True
+}
+
+
+def message_document_to_item(document: dict[str, Any]) -> dict[str, Any]:
+    """Parse OpenSearch document of message-history index to langchain message dict"""
+    # Actual langchain history
+    item = json.loads(document["_source"]["history"])
+
+    # Message metadata
+    item["data"]["id"] = document["_id"] # Add message id
+    item["data"]["additional_kwargs"]["rating"] = document["_source"].get("rating", None)
+
+    return item
+
+
+def load_session_messages(client: OpenSearch, session_id: str) -> list[dict[str, Any]]:
+    """
+    Load the full message history of session from OpenSearch
+
+    Messages that were written but are not searchable yet are taken
+    from the pending writes buffer.
+    """
+    # This function was gotten from
+    # > langchain_elasticsearch.chat_history.ElasticsearchChatMessageHistory.get_messages()
+    # with small adjustments, like:
+    #     - added message id to ["data"]["id"]
+    #
+    search_after: dict[str, Any] = {}
+    items = []
+
+    while True:
+        try:
+            result = client.search(
+                index = Settings.services.vectorbase.indexes.message_history,
+                query = {"term": {"session_id": session_id}},
+                sort = "created_at:asc",
+                size = 100,
+                **search_after,
+            )
+        except Exception as err:
+            logger.error("Could not retrieve messages from OpenSearch: %s", err)
+            raise err
+
+        if result and len(result["hits"]["hits"]) > 0:
+            for document in result["hits"]["hits"]:
+                items.append(message_document_to_item(document))
+            search_after = {"search_after": result["hits"]["hits"][-1]["sort"]}
+        else:
+            break
+
+    # Read-your-writes
+    items = PENDING_WRITES.merge(session_id, items)
+
+    return items
+
+
+async def aload_session_messages(
+    client: AsyncOpenSearch,
+    session_id: str
+) -> list[dict[str, Any]]:
+    """Async version of `load_session_messages`"""
+    search_after: dict[str, Any] = {}
+    items = []
+
+    while True:
+        try:
+            result = await client.search(
+                index = Settings.services.vectorbase.indexes.message_history,
+                body = {
+                    "query": {"term": {"session_id": session_id}},
+                    "sort": [{"created_at": "asc"}],
+                    "size": 100,
+                    **search_after
+                }
+            )
+        except Exception as err:
+            logger.error("Could not retrieve messages from OpenSearch: %s", err)
+            raise err
+
+        if result and len(result["hits"]["hits"]) > 0:
+            for document in result["hits"]["hits"]:
+                items.append(message_document_to_item(document))
+            search_after = {"search_after": result["hits"]["hits"][-1]["sort"]}
+        else:
+            break
+
+    # Read-your-writes
+    items = PENDING_WRITES.merge(session_id, items)
+
+    return items
+
+
 class OpenSearchChatMessageHistoryWithParameters(OpenSearchChatMessageHistory):
     """
-    Inherited custom class to add new parameters when saving message with 
+    Inherited custom class to add new parameters when saving message with
     Langchain RunnableWithMessageHistory.
-    
+
     So we can add addtional parameters that are needed to be save with message
     """
+    @property
+    def messages(self) -> list[BaseMessage]:
+        """
+        Retrieve the messages of session
+
+        Rewritten property from super().messages: uses the message history cache
+        and sees messages that are not refreshed in OpenSearch yet
+        """
+        items = MESSAGE_HISTORY_CACHE.get(self.session_id)
+        if items is None:
+            items = load_session_messages(self.client, self.session_id)
+            MESSAGE_HISTORY_CACHE.put(self.session_id, items)
+
+        return messages_from_dict(items)
+
+
     def add_message(self, message: BaseMessage, rating: int = 0):
         """
         Add messages to the chat session in Elasticsearch
-        
+
         Rewritten method from super().add_message()
         """
         logger.info("Adding messages to OpenSearch.")
-        self.client.index(
+        write_mode = Settings.services.vectorbase.history_write_mode
+        message_dict = message_to_dict(message)
+        result = self.client.index(
             index=self.index,
             body={
                 "session_id": self.session_id,
                 "created_at": round(time() * 1000),
                 "history": json.dumps(
-                    message_to_dict(message),
+                    message_dict,
                     ensure_ascii=self.ensure_ascii,
                 ),
                 # Parameters below were added
                 # ---------------------------
-                "rating": rating 
+                "rating": rating
                 # ---------------------------
             },
-            refresh=True,
+            refresh=REFRESH_BY_WRITE_MODE[write_mode],
         )
         logger.info("Messages added to OpenSearch.")
 
+        message_dict["data"]["id"] = result["_id"]
+        message_dict["data"]["additional_kwargs"]["rating"] = rating
+
+        # Without refresh message is not searchable for a while
+        if write_mode == "none":
+            PENDING_WRITES.add(self.session_id, message_dict)
+
+        # Keep cached history of this session up to date
+        MESSAGE_HISTORY_CACHE.append(self.session_id, message_dict)
+
 
 
 def get_session_history(session_id) -> OpenSearchChatMessageHistoryWithParameters:
-    client = OpenSearchConnection()
+    # Process-wide client, there is no new connection per chain invocation
+    client = get_opensearch_client()
 
     # Actual MessageHistory class
     history = OpenSearchChatMessageHistoryWithParameters(
-        es_connection = client.client,
-        index = Settings.services.vectorbase.indexes.message_history, 
+        opensearch_connection = client,
+        index = Settings.services.vectorbase.indexes.message_history,
         session_id = session_id,
-        esnsure_ascii = False
+        ensure_ascii = False
     )
-    return history
\ No newline at end of file
+    return history
@@ -0,0 +1,257 @@
+from collections import OrderedDict
+from copy import deepcopy
+from threading import Lock
+from time import time
+
+from gm_services.config import Settings
+
+from typing import Any
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class MessageHistoryCache:
+    """
+    Bounded in-process LRU cache of parsed message history, keyed by session_id.
+
+    Items are kept in the same form as `AsyncOpenSearchChatHandler.get_messages(mode="dict")`
+    returns them (langchain message dict with `data.id` and `data.additional_kwargs.rating`).
+    Writers update cached sessions in place instead of dropping them, so the next
+    read of an active chat does not go to OpenSearch at all.
+
+    Arguments
+    ---------
+    maxsize: int
+        Maximum number of sessions to keep. `0` disables the cache.
+    """
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+
+        self._sessions: OrderedDict[str, list[dict[str, Any]]] = OrderedDict()
+        # message_id -> session_id, for writers that only know message_id
+        self._message_sessions: dict[str, str] = {}
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+
+    def _forget_session(self, session_id: str) -> None:
+        items = self._sessions.pop(session_id, None)
+        if items is None:
+            return
+
+        for item in items:
+            self._message_sessions.pop(item["data"]["id"], None)
+
+
+    def get(self, session_id: str) -> list[dict[str, Any]] | None:
+        """Return a copy of cached history, or `None` if session is not cached"""
+        with self._lock:
+            items = self._sessions.get(session_id)
+            if items is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._sessions.move_to_end(session_id)
+            return deepcopy(items)
+
+
+    def get_message(self, session_id: str, message_id: str) -> dict[str, Any] | None:
+        """Return a copy of one cached message, or `None` if it is not cached"""
+        with self._lock:
+            if self._message_sessions.get(message_id) != session_id:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._sessions.move_to_end(session_id)
+            for item in self._sessions[session_id]:
+                if item["data"]["id"] == message_id:
+                    return deepcopy(item)
+
+        return None
+
+
+    def get_last_message_id(self, session_id: str) -> str | None:
+        """Id of the last cached message of session, or `None` if it is not cached"""
+        with self._lock:
+            items = self._sessions.get(session_id)
+            if not items:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._sessions.move_to_end(session_id)
+            return items[-1]["data"]["id"]
+
+
+    def put(self, session_id: str, items: list[dict[str, Any]]) -> None:
+        """Save the full history of session"""
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._forget_session(session_id)
+            self._sessions[session_id] = deepcopy(items)
+
+            for item in items:
+                self._message_sessions[item["data"]["id"]] = session_id
+
+            # Evict least recently used sessions
+            while len(self._sessions) > self.maxsize:
+                oldest_session_id = next(iter(self._sessions))
+                self._forget_session(oldest_session_id)
+
+
+    def append(self, session_id: str, item: dict[str, Any]) -> None:
+        """
+        Add new message to the end of cached history.
+
+        Does nothing if session is not cached: the next read will load
+        the full history, including this message.
+        """
+        with self._lock:
+            items = self._sessions.get(session_id)
+            if items is None:
+                return
+
+            items.append(deepcopy(item))
+            self._message_sessions[item["data"]["id"]] = session_id
+
+
+    def update_parameter(
+        self,
+        message_id: str,
+        parameter_name: str,
+        parameter_value: Any
+    ) -> None:
+        """Update parameter in `data.additional_kwargs` of cached message"""
+        with self._lock:
+            session_id = self._message_sessions.get(message_id)
+            if session_id is None:
+                return
+
+            for item in self._sessions.get(session_id, []):
+                if item["data"]["id"] == message_id:
+                    item["data"]["additional_kwargs"][parameter_name] = parameter_value
+                    break
+
+
+    def invalidate(self, session_id: str) -> None:
+        with self._lock:
+            self._forget_session(session_id)
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+            self._message_sessions.clear()
+
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Hit/miss counters and current size of the cache"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "sessions": len(self._sessions),
+            "maxsize": self.maxsize
+        }
+
+
+
+class PendingWritesBuffer:
+    """
+    Messages that were indexed without a forced refresh and could be not
+    searchable yet, keyed by session_id.
+
+    Readers merge them into what OpenSearch returned, so a chat always sees
+    its own writes. Message leaves the buffer once OpenSearch returns it
+    or after `max_age` seconds (it is surely refreshed by then).
+
+    Arguments
+    ---------
+    max_age: float
+        Seconds to keep a message in the buffer.
+    """
+    def __init__(self, max_age: float) -> None:
+        self.max_age = max_age
+
+        # session_id -> [(written_at, item)] in write order
+        self._sessions: dict[str, list[tuple[float, dict[str, Any]]]] = {}
+        self._lock = Lock()
+
+
+    def _drop_expired(self) -> None:
+        deadline = time() - self.max_age
+        for session_id in list(self._sessions.keys()):
+            pending = [
+                (written_at, item) for written_at, item in self._sessions[session_id]
+                if written_at > deadline
+            ]
+            if pending:
+                self._sessions[session_id] = pending
+            else:
+                del self._sessions[session_id]
+
+
+    def add(self, session_id: str, item: dict[str, Any]) -> None:
+        with self._lock:
+            self._drop_expired()
+            self._sessions.setdefault(session_id, []).append((time(), deepcopy(item)))
+
+
+    def merge(self, session_id: str, items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Append pending messages that are missing in `items` (loaded from OpenSearch).
+
+        Pending messages that are already in `items` are removed from the buffer.
+        """
+        with self._lock:
+            self._drop_expired()
+            pending = self._sessions.get(session_id)
+            if not pending:
+                return items
+
+            loaded_ids = {item["data"]["id"] for item in items}
+            not_visible = [
+                (written_at, item) for written_at, item in pending
+                if item["data"]["id"] not in loaded_ids
+            ]
+
+            if not_visible:
+                self._sessions[session_id] = not_visible
+            else:
+                del self._sessions[session_id]
+
+            return items + [deepcopy(item) for _, item in not_visible]
+
+
+    def get_last_message_id(self, session_id: str) -> str | None:
+        """Id of the latest pending message of session, if there is any"""
+        with self._lock:
+            self._drop_expired()
+            pending = self._sessions.get(session_id)
+            if not pending:
+                return None
+
+            return pending[-1][1]["data"]["id"]
+
+
+    def invalidate(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+
+# Shared between AsyncOpenSearchChatHandler (reads) and
+# OpenSearchChatMessageHistoryWithParameters (writes)
+MESSAGE_HISTORY_CACHE = MessageHistoryCache(
+    maxsize = Settings.services.vectorbase.history_cache_size
+)
+PENDING_WRITES = PendingWritesBuffer(
+    max_age = Settings.services.vectorbase.pending_writes_max_age
+)
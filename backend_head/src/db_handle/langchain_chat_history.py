@@ -3,6 +3,7 @@
 # and made some modifications:
 # - now we can provide existing OpenSearch connection in init
 # - get_messages method for compatibility
+# - index existence is checked once per process
 
 from time import time
 from typing import List, Optional
@@ -16,6 +17,7 @@ from langchain_core.messages import (
 )
 
 from opensearchpy import OpenSearch
+from gm_services.database.vectorstore.osdb_pool import create_index_if_not_exists
 
 import logging
 logger = logging.getLogger(__name__)
@@ -55,24 +57,20 @@ class OpenSearchChatMessageHistory(BaseChatMessageHistory):
         else:
             self.client: OpenSearch = OpenSearch([opensearch_url])
 
-        if self.client.indices.exists(index=index):
-            logger.info(
-                f"Chat history index '{index}' already exists, skipping creation."
-            )
-        else:
-            logger.info(f"Creating index '{index}' for storing chat history.")
-            self.client.indices.create(
-                index=index,
-                body={
-                    "mappings": {
-                        "properties": {
-                            "session_id": {"type": "keyword"},
-                            "created_at": {"type": "date"},
-                            "history": {"type": "text"},
-                        }
+        # Memoized: only the first history of the process asks OpenSearch
+        create_index_if_not_exists(
+            client=self.client,
+            index_name=index,
+            body={
+                "mappings": {
+                    "properties": {
+                        "session_id": {"type": "keyword"},
+                        "created_at": {"type": "date"},
+                        "history": {"type": "text"},
                     }
-                },
-            )
+                }
+            },
+        )
         logger.info("OpenSearchChatMessageHistory class initialized successfully.")
 
     @property
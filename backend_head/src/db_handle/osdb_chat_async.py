@@ -0,0 +1,408 @@
+from gm_services.database.vectorstore import AsyncOpenSearchConnection
+from gm_services.common import generate_hex
+from gm_services.config import Settings
+from .osdb_chat import (
+    HISTORY_MESSAGE_TYPE,
+    transform_messages,
+    docs_to_chat_actions,
+    placeholder_update_query
+)
+from .history_cache import MESSAGE_HISTORY_CACHE, PENDING_WRITES
+from .history import aload_session_messages, message_document_to_item
+
+from langchain_core.messages import BaseMessage
+from typing import Any
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class AsyncOpenSearchChatHandler(AsyncOpenSearchConnection):
+    """
+    Chats, message history, prompt library and context documents of users.
+
+    Every method is awaitable and runs on the shared `AsyncOpenSearch` client,
+    so one slow query doesn't freeze the event loop for other websocket users.
+    """
+    def __init__(self):
+        super().__init__()
+
+    # ---------------
+    # Message history
+    # ---------------
+    async def get_messages(
+        self,
+        session_id: str,
+        mode: HISTORY_MESSAGE_TYPE = "dict"
+    ) -> list[dict[str, Any]] | list[BaseMessage]:
+        """Get the messages by the session id"""
+        # Parsed history of active chats is kept in memory
+        items = MESSAGE_HISTORY_CACHE.get(session_id)
+        if items is None:
+            items = await aload_session_messages(self.client, session_id)
+            MESSAGE_HISTORY_CACHE.put(session_id, items)
+
+        items = transform_messages(items, mode)
+
+        return items
+
+
+    async def _load_message_by_id(self, session_id: str, message_id: str) -> dict[str, Any] | None:
+        """Point lookup of one message by its document id"""
+        try:
+            document = await self.client.get(
+                index = Settings.services.vectorbase.indexes.message_history,
+                id = message_id
+            )
+        # There is no document with this id
+        except Exception as err:
+            logger.info("Could not get message %s from OpenSearch: %s", message_id, err)
+            return None
+
+        if not document.get("found", False):
+            return None
+
+        # Message id must belong to requested session
+        if document["_source"].get("session_id") != session_id:
+            return None
+
+        return message_document_to_item(document)
+
+
+    async def get_message_by_id(
+        self,
+        session_id: str,
+        message_id: str,
+        mode: HISTORY_MESSAGE_TYPE = "dict"
+    ) -> dict[str, Any] | BaseMessage | None:
+        """
+        Returns
+        -------
+        message: dict[str, Any] | BaseMessage | None
+            Message that matched with provided `message_id`. Type based on `mode` parameter.
+            Could be *None* if there were no matched messages.
+        """
+        result = MESSAGE_HISTORY_CACHE.get_message(session_id, message_id)
+        if result is None:
+            result = await self._load_message_by_id(session_id, message_id)
+
+        if result is None:
+            logger.error("There is no message with that message_id: %s", message_id)
+            return None
+
+        result = transform_messages(messages=[result], mode=mode)[0]
+
+        return result
+
+
+    async def get_last_message_id(self, session_id: str) -> str | None:
+        """Id of the latest message in session, or `None` if session is empty"""
+        message_id = MESSAGE_HISTORY_CACHE.get_last_message_id(session_id)
+        if message_id is not None:
+            return message_id
+
+        # Latest write could be not searchable yet
+        message_id = PENDING_WRITES.get_last_message_id(session_id)
+        if message_id is not None:
+            return message_id
+
+        # Only the newest document is needed, without its source
+        result = await self.client.search(
+            index = Settings.services.vectorbase.indexes.message_history,
+            body = {
+                "query": {"term": {"session_id": session_id}},
+                "sort": [{"created_at": "desc"}],
+                "size": 1,
+                "_source": False
+            }
+        )
+
+        if result and len(result["hits"]["hits"]) > 0:
+            return result["hits"]["hits"][0]["_id"]
+
+        return None
+
+
+    def get_history_cache_stats(self) -> dict[str, int]:
+        """Hit/miss counters of in-memory message history cache"""
+        return MESSAGE_HISTORY_CACHE.stats
+
+
+    async def update_langchain_message(
+        self,
+        message_id: str,
+        parameter_name: str,
+        parameter_value: Any
+    ) -> None:
+        """Update parameter in history.additional_kwargs"""
+        await self.update_document(
+            index_name = Settings.services.vectorbase.indexes.message_history,
+            doc_id = message_id,
+            doc_body = {
+                parameter_name: parameter_value
+            }
+        )
+        MESSAGE_HISTORY_CACHE.update_parameter(message_id, parameter_name, parameter_value)
+
+
+    # ------------
+    # User's chats
+    # ------------
+    async def add_chat_id(
+        self,
+        user_id: str,
+        session_id: str,
+        session_name: str = "Название чата"
+    ) -> None:
+        recording = {
+            "user_id": user_id,
+            "session_name": session_name
+        }
+
+        await self.client.create(
+            index = Settings.services.vectorbase.indexes.chats,
+            id = session_id,
+            body = recording
+        )
+
+
+    async def update_chat_id(
+        self,
+        session_id: str,
+        session_name: str
+    ) -> None:
+        await self.client.update(
+            index = Settings.services.vectorbase.indexes.chats,
+            id = session_id,
+            body = {"doc": {
+                "session_name": session_name
+            }}
+        )
+
+
+    async def get_chat_ids(self, user_id: str) -> list[dict[str, str]] | None:
+        """
+        Returns
+        -------
+        user_chats: list[dict[str, str]]
+            List of user chats belongs to `user_id`.
+            Dictionary has this structure:
+            ```
+            [
+                {
+                    "session_id": "name of session",
+                    "name: "name of session"
+                }
+            ]
+            ```
+        """
+        try:
+            # Find 100 records of saved session_id for current user_id
+            result = await self.client.search(
+                index = Settings.services.vectorbase.indexes.chats,
+                body = {"query": {"term": {"user_id": user_id}}},
+                size = 100
+            )
+        except Exception as err:
+            logger.exception("Could not find any session_id for user_id = %s", user_id)
+            logger.error(err)
+            raise err
+
+        if result and len(result["hits"]["hits"]) > 0:
+            result = result["hits"]["hits"]
+
+            user_chats = []
+            for record in result:
+                user_chats.append({
+                    "session_id": record["_id"],
+                    "name": record["_source"]["session_name"]
+                })
+
+            return user_chats
+
+        return None
+
+    async def delete_chat_id(self, session_id: str) -> None:
+        MESSAGE_HISTORY_CACHE.invalidate(session_id)
+        PENDING_WRITES.invalidate(session_id)
+        try:
+            await self.client.delete(
+                index = Settings.services.vectorbase.indexes.chats,
+                id = session_id
+            )
+        except:
+            logger.info("There is no chat with session_id = %s", session_id)
+            pass
+
+
+    # --------------
+    # Prompt library
+    # --------------
+    async def add_prompt_library(self, user_id: str, prompt: str, name: str) -> str:
+        """
+        Return an id of this prompt recording in library
+        """
+        prompt_id = generate_hex(8)
+        recording = {
+            "user_id": user_id,
+            "name": name,
+            "prompt": prompt
+        }
+
+        await self.client.create(
+            index = Settings.services.vectorbase.indexes.prompt_library,
+            id = prompt_id,
+            body = recording
+        )
+
+        return prompt_id
+
+
+    async def get_prompt_library(self, user_id: str) -> list[dict[str, str]]:
+        """
+        Returns
+        -------
+        prompt_library: list[dict[str, str]]
+            List of prompt library belongs to `user_id`.
+            Dictionary has this structure:
+            ```
+            [
+                {
+                    "prompt_id": "id of recording",
+                    "name": "name of this prompt",
+                    "prompt": "text of this prompt"
+                }
+            ]
+            ```
+        """
+        try:
+            # Find 100 records of saved prompts for current user_id
+            result = await self.client.search(
+                index = Settings.services.vectorbase.indexes.prompt_library,
+                body = {"query": {"term": {"user_id": user_id}}},
+                size = 100
+            )
+        except Exception as err:
+            logger.info("Could not find any saved prompts for user_id = %s", user_id)
+            logger.info(err)
+            return []
+
+        if result and len(result["hits"]["hits"]) > 0:
+            result = result["hits"]["hits"]
+
+            prompt_library = []
+            for record in result:
+                prompt_library.append({
+                    "prompt_id": record["_id"],
+                    "name": record["_source"]["name"],
+                    "prompt": record["_source"]["prompt"]
+                })
+
+            return prompt_library
+
+        return []
+
+
+    async def delete_prompt_library(self, prompt_id: str) -> None:
+        try:
+            await self.client.delete(
+                index = Settings.services.vectorbase.indexes.prompt_library,
+                id = prompt_id
+            )
+        except:
+            # If there is an error - there is no recording with this id
+            # So we just log it, we can't delete anythings with this id
+            logger.info("There is no prompt with id = %s in prompt library", prompt_id)
+            pass
+
+
+    async def update_prompt_library(self, prompt_id: str, prompt: str, name: str) -> None:
+        await self.client.update(
+            index = Settings.services.vectorbase.indexes.prompt_library,
+            id = prompt_id,
+            body = {"doc": {
+                "name": name,
+                "prompt": prompt
+            }}
+        )
+
+
+    # ----------------------------------
+    # Connect uploaded documents to chat
+    # ----------------------------------
+    async def add_docs_to_chat(
+        self,
+        doc_ids: list[str],
+        user_id: str,
+        session_id: str
+    ) -> dict[str, str]:
+        """
+        Connect document's ids to current session_id (chat)
+
+        Returns
+        -------
+        errors: dict[str, str]
+            Error of `_bulk` request for every document that was not connected,
+            keyed by document id. Empty if everything was connected.
+        """
+        actions = docs_to_chat_actions(doc_ids, user_id, session_id)
+        document_ids = {action["_id"]: str(action["_source"]["document_id"]) for action in actions}
+
+        errors = {}
+        for error in await self.bulk(actions):
+            # {"create": {"_id": ..., "status": ..., "error": {...}}}
+            [item] = error.values()
+            reason = item.get("error", item.get("status"))
+            if isinstance(reason, dict):
+                reason = reason.get("reason", reason.get("type"))
+            errors[document_ids.get(item.get("_id"), "")] = str(reason)
+
+        return errors
+
+
+    async def get_doc_ids_of_chat(self, session_id: str) -> list[str]:
+        """Get all ids of documents connected to provided session_id"""
+        try:
+            result = await self.client.search(
+                index = Settings.services.vectorbase.indexes.context,
+                body = {"query": {"term": {"session_id": session_id}}},
+                size = 100
+            )
+        except Exception as err:
+            logger.info("Could not find any connected documents for session_id = %s", session_id)
+            logger.info(err)
+            return []
+
+        if result and len(result["hits"]["hits"]) > 0:
+            result = result["hits"]["hits"]
+
+            doc_ids = []
+            for record in result:
+                doc_ids.append(record["_source"]["document_id"])
+
+            return doc_ids
+
+        return []
+
+
+    async def remove_document_session_id_placeholder(
+        self,
+        user_id: str,
+        session_id: str
+    ) -> None:
+        """
+        Replace a document session_id placeholder with a valid session_id value
+
+        **Comment**: This is needed to be done because when new documents are uploaded there is
+        no actual session_id in exist, because new session starts right after user's click,
+        and value could not be created at this point. So document firstly registrated with user_id and
+        DOCUMENT_SESSION_ID_PLACEHOLDER and then we must replace it with a real value once we got to the point
+        where it matters
+        """
+        await self.client.update_by_query(
+            index = Settings.services.vectorbase.indexes.context,
+            body = placeholder_update_query(user_id, session_id),
+            conflicts = "proceed",
+            # Documents of this session are searched right after that
+            refresh = True
+        )
@@ -1,4 +1,5 @@
 import asyncio
+import httpx
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
@@ -9,20 +10,22 @@ from gm_services.clients import DocumentHandlerClient, RetrieverClient
 from gm_services.neural.llm import LLModelShell
 from gm_services.neural.llm.tools import MainToolkit, ToolCallingRunnable
 from .db_handle.osdb_chat import OpenSearchChatHandler
+from .db_handle.osdb_chat_async import AsyncOpenSearchChatHandler
 from .db_handle.history import get_session_history
 from gm_services.database.tablestore import PGHandler
 from gm_services.common import load_prompt, cut_thinking_part_of_message, unmark
 from gm_services.schemas.document_handler import TranscriptionStatusEnum
 from gm_services.config import Settings
 
-from gm_services.schemas.extraction import ExtractedDocument
-from gm_services.schemas.document_handler import TranscriptionResponse
+from gm_services.schemas.extraction import ExtractedDocument, Page
+from gm_services.schemas.document_handler import TranscriptionResponse, FileUploadResult
 from gm_services.schemas.understanding import DocumentView
 from .db_handle.osdb_chat import HISTORY_MESSAGE_TYPE
 from gm_services.database.tablestore.table_schemas.user import User
 from gm_services.neural.llm.tools.tool_interface import TOOL_NAMES
 from langchain_core.messages import BaseMessage
 from fastapi import UploadFile
+from uuid import UUID
 from typing import Literal, Any
 
 from dotenv import load_dotenv
@@ -34,6 +37,11 @@ logger = logging.getLogger(__name__)
 
 RUNNALE_TYPES = Literal["default", "mail"]
 
+FINISHED_TRANSCRIPTION_STATUSES = (
+    TranscriptionStatusEnum.SUCCESS.value,
+    TranscriptionStatusEnum.ERROR.value
+)
+
 
 class Head:
     def __init__(self):
@@ -41,7 +49,10 @@ class Head:
         self.model = LLModelShell(Settings.models.llm)
 
         # Databases
+        # Sync handler is for langchain parts (tools, vectorstore setup),
+        # async one is for everything that runs inside the event loop
         self.vector_base = OpenSearchChatHandler()
+        self.async_vector_base = AsyncOpenSearchChatHandler()
         self.tablestore = PGHandler()
 
         # Inner modules
@@ -62,50 +73,63 @@ class Head:
     # Mirror methods
     # --------------
     # User
-    def find_user(self, user_id: str) -> User | None:
+    async def find_user(self, user_id: str) -> User | None:
         """Return `User` if there is a match, or `None` if nothing was found"""
-        return self.tablestore.find_user(user_id)
+        return await self.tablestore.afind_user(user_id)
     
-    def check_password(self, user_id: str, user_password: str) -> bool:
-        return self.tablestore.check_password(user_id, user_password)
+    async def check_password(self, user_id: str, user_password: str) -> bool:
+        return await self.tablestore.acheck_password(user_id, user_password)
+
+    def get_tablestore_cache_stats(self) -> dict[str, dict[str, int]]:
+        """Hit/miss counters of users, positions and credentials caches"""
+        return self.tablestore.cache_stats
+
+    def invalidate_tablestore_cache(self) -> None:
+        """Drop cached users, positions and credentials, e.g. after tables were loaded again"""
+        self.tablestore.invalidate_cache()
     
     # Message history
-    def get_message_by_id(
+    async def get_message_by_id(
         self,
         session_id: str,
         message_id: str,
         mode: HISTORY_MESSAGE_TYPE = "dict"
-    ) -> list[dict[str, Any]] | list[BaseMessage] | None:
+    ) -> dict[str, Any] | BaseMessage | None:
         """
         Returns
         -------
-        message: list[dict[str, Any]] | list[BaseMessage] | None
+        message: dict[str, Any] | BaseMessage | None
             Message that matched with provided `message_id`. Type based on `mode` parameter.  
             Could be *None* if there were no matched messages.
         """
-        return self.vector_base.get_message_by_id(session_id, message_id, mode)
+        return await self.async_vector_base.get_message_by_id(session_id, message_id, mode)
     
-    def get_last_message_id(self, session_id: str) -> str:
-        return self.vector_base.get_last_message_id(session_id)
+    async def get_last_message_id(self, session_id: str) -> str | None:
+        """Id of the latest message in session, or `None` if session is empty"""
+        return await self.async_vector_base.get_last_message_id(session_id)
     
-    def get_messages(
+    async def get_messages(
         self, 
         session_id: str,
         mode: HISTORY_MESSAGE_TYPE = "dict"
     ) -> list[dict[str, Any]] | list[BaseMessage]:
-        return self.vector_base.get_messages(session_id, mode)
+        return await self.async_vector_base.get_messages(session_id, mode)
 
-    def update_langchain_message(
+    async def update_langchain_message(
         self, 
         message_id: str, 
         parameter_name: str, 
         parameter_value: Any
     ) -> None:
         """Update parameter in history.additional_kwargs"""
-        self.vector_base.update_langchain_message(message_id, parameter_name, parameter_value)
+        await self.async_vector_base.update_langchain_message(message_id, parameter_name, parameter_value)
+    
+    def get_history_cache_stats(self) -> dict[str, int]:
+        """Hit/miss counters of in-memory message history cache"""
+        return self.async_vector_base.get_history_cache_stats()
     
     # Document extraction
-    def remove_document_session_id_placeholder(
+    async def remove_document_session_id_placeholder(
         self, 
         user_id: str, 
         session_id: str
@@ -119,39 +143,38 @@ class Head:
         DOCUMENT_SESSION_ID_PLACEHOLDER and then we must replace it with a real value once we got to the point
         where it matters
         """
-        self.vector_base.remove_document_session_id_placeholder(user_id, session_id)
+        await self.async_vector_base.remove_document_session_id_placeholder(user_id, session_id)
     
-    def add_extracted_info(self, session_id: str, extracted: DocumentView) -> None:
-        self.vector_base.add_extracted_info(session_id, extracted)
-        pass
+    async def add_extracted_info(self, session_id: str, extracted: DocumentView) -> None:
+        await self.async_vector_base.add_extracted_info(session_id, extracted)
 
-    def get_extracted_info(self, session_id: str) -> DocumentView | None:
+    async def get_extracted_info(self, session_id: str) -> DocumentView | None:
         """Get the saved DocumentView by session_id
 
         Return None if there is no matching DocumentView
         """
-        return self.vector_base.get_extracted_info(session_id)
+        return await self.async_vector_base.get_extracted_info(session_id)
 
-    def delete_extracted_info(self, session_id: str) -> None:
-        self.vector_base.delete_extracted_info(session_id)
+    async def delete_extracted_info(self, session_id: str) -> None:
+        await self.async_vector_base.delete_extracted_info(session_id)
 
     # User's chats
-    def add_chat_id(
+    async def add_chat_id(
         self, 
         user_id: str, 
         session_id: str, 
         session_name: str = "Название чата"
     ) -> None:
-        self.vector_base.add_chat_id(user_id, session_id, session_name)
+        await self.async_vector_base.add_chat_id(user_id, session_id, session_name)
     
-    def update_chat_id(
+    async def update_chat_id(
         self,
         session_id: str,
         session_name: str
     ) -> None:
-        self.vector_base.update_chat_id(session_id, session_name)
+        await self.async_vector_base.update_chat_id(session_id, session_name)
     
-    def get_chat_ids(self, user_id: str) -> list[dict[str, str]] | None:
+    async def get_chat_ids(self, user_id: str) -> list[dict[str, str]] | None:
         """
         Returns
         -------
@@ -167,19 +190,19 @@ class Head:
             ]
             ```
         """
-        return self.vector_base.get_chat_ids(user_id)
+        return await self.async_vector_base.get_chat_ids(user_id)
     
-    def delete_chat_id(self, session_id: str) -> None:
-        self.vector_base.delete_chat_id(session_id)
+    async def delete_chat_id(self, session_id: str) -> None:
+        await self.async_vector_base.delete_chat_id(session_id)
     
     # User's prompt library
-    def add_prompt_library(self, user_id: str, prompt: str, name: str) -> str:
+    async def add_prompt_library(self, user_id: str, prompt: str, name: str) -> str:
         """
         Return an id of this prompt recording in library
         """
-        return self.vector_base.add_prompt_library(user_id, prompt, name)
+        return await self.async_vector_base.add_prompt_library(user_id, prompt, name)
 
-    def get_prompt_library(self, user_id: str) -> list[dict[str, str]]:
+    async def get_prompt_library(self, user_id: str) -> list[dict[str, str]]:
         """
         Returns
         -------
@@ -196,59 +219,202 @@ class Head:
             ]
             ```
         """
-        return self.vector_base.get_prompt_library(user_id)
+        return await self.async_vector_base.get_prompt_library(user_id)
     
-    def delete_prompt_library(self, prompt_id: str) -> None:
-        self.vector_base.delete_prompt_library(prompt_id)
+    async def delete_prompt_library(self, prompt_id: str) -> None:
+        await self.async_vector_base.delete_prompt_library(prompt_id)
     
-    def update_prompt_library(self, prompt_id: str, prompt: str, name: str) -> None:
-        self.vector_base.update_prompt_library(prompt_id, prompt, name)
+    async def update_prompt_library(self, prompt_id: str, prompt: str, name: str) -> None:
+        await self.async_vector_base.update_prompt_library(prompt_id, prompt, name)
     
     # ----------------
     # ----------------
     # ----------------
     
+    async def _upload_one_file(
+        self,
+        file: UploadFile,
+        user_id: str,
+        semaphore: asyncio.Semaphore
+    ) -> FileUploadResult:
+        """Upload one file to document handler, errors are reported in result"""
+        async with semaphore:
+            try:
+                # File body is streamed from UploadFile, it's not read into memory
+                document_info = await self.document_handler.files_upload(
+                    user_id = user_id,
+                    file_data = file.file,
+                    content_type = file.content_type,
+                    filename = file.filename
+                )
+            except Exception as err:
+                logger.exception("Could not upload file %s", file.filename)
+                return FileUploadResult(filename = file.filename, error = str(err))
+
+        return FileUploadResult(filename = file.filename, id = document_info.id)
+
+
     async def files_upload(
         self, 
         files: list[UploadFile],
         user_id: str,
         session_id: str
-    ) -> None:
-        "Upload multiple files, register them to user and current session_id"
-        document_ids = []
-        for file in files:
-            # Upload file to database
-            document_info = await self.document_handler.files_upload(
+    ) -> list[FileUploadResult]:
+        """
+        Upload multiple files, register them to user and current session_id
+
+        Files are uploaded concurrently, at most `upload_concurrency` at a time.
+
+        Returns
+        -------
+        results: list[FileUploadResult]
+            Upload result of every file, in the order of `files`
+        """
+        semaphore = asyncio.Semaphore(Settings.services.document_handler.upload_concurrency)
+        results = await asyncio.gather(*[
+            self._upload_one_file(file, user_id, semaphore)
+            for file in files
+        ])
+
+        # Connect uploaded documents to chat
+        document_ids = [result.id for result in results if result.uploaded]
+        if document_ids:
+            errors = await self.async_vector_base.add_docs_to_chat(
+                doc_ids = document_ids,
                 user_id = user_id,
-                file_data = file.file,
-                content_type = file.content_type,
-                filename = file.filename
+                session_id = session_id
             )
-            document_ids.append(document_info.id)
 
-        # Connect this documents to chat
-        self.vector_base.add_docs_to_chat(
-            doc_ids = document_ids,
-            user_id = user_id,
-            session_id = session_id
-        )
+            for result in results:
+                if result.uploaded and str(result.id) in errors:
+                    result.error = f"File was uploaded, but not connected to chat: {errors[str(result.id)]}"
+
+        return results
 
     
+    async def _wait_for_transcriptions(self, task_ids: list[UUID]) -> dict[UUID, str]:
+        """
+        Wait until all transcription tasks are finished
+
+        Document handler pushes status transitions of tasks, polling
+        is used only if push notifications are off or unavailable.
+
+        Returns
+        -------
+        statuses: dict[UUID, str]
+            Final status of every finished task. Tasks that didn't finish
+            in `transcription_timeout` are not included.
+        """
+        settings = Settings.services.document_handler
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.transcription_timeout
+
+        pending = set(task_ids)
+        statuses: dict[UUID, str] = {}
+
+        if settings.status_notifications:
+            try:
+                await self._watch_transcriptions(pending, statuses, settings.transcription_timeout)
+            except httpx.HTTPError as err:
+                logger.warning("Status notifications are unavailable, falling back to polling: %s", err)
+
+        if pending and loop.time() < deadline:
+            await self._poll_transcriptions(pending, statuses, deadline)
+
+        if pending:
+            logger.warning("Transcription tasks are not finished in time: %s", pending)
+
+        return statuses
+
+
+    async def _watch_transcriptions(
+        self,
+        pending: set[UUID],
+        statuses: dict[UUID, str],
+        timeout: float
+    ) -> None:
+        """Collect final statuses from the stream of status transitions"""
+        async for status in self.document_handler.watch_statuses(list(pending), timeout):
+            if status.status in FINISHED_TRANSCRIPTION_STATUSES:
+                statuses[status.id] = status.status
+                pending.discard(status.id)
+
+
+    async def _poll_transcriptions(
+        self,
+        pending: set[UUID],
+        statuses: dict[UUID, str],
+        deadline: float
+    ) -> None:
+        """
+        Poll statuses of all tasks with one batch request per round,
+        interval between rounds grows up to `status_poll_max_interval`
+        """
+        settings = Settings.services.document_handler
+        loop = asyncio.get_running_loop()
+        interval = settings.status_poll_interval
+
+        while pending:
+            for status in await self.document_handler.get_statuses(list(pending)):
+                if status.status in FINISHED_TRANSCRIPTION_STATUSES:
+                    statuses[status.id] = status.status
+                    pending.discard(status.id)
+
+            if not pending or loop.time() + interval > deadline:
+                break
+
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, settings.status_poll_max_interval)
+
+
+    @staticmethod
+    def _to_extracted_document(transcription: TranscriptionResponse) -> ExtractedDocument:
+        """Transcription content could be a whole document or a single page"""
+        content = transcription.content
+        if "pages" in content:
+            return ExtractedDocument.model_validate(content)
+
+        return ExtractedDocument(pages = [Page.model_validate(content)])
+
+
     async def extract_text(self, user_id: str, session_id: str) -> list[ExtractedDocument]:
-        extracted_texts = []
+        """
+        Transcribe all documents of session
+
+        Tasks for all documents are created at once and processed in parallel
+        by document handler. Result keeps the order of documents,
+        documents that failed to transcribe are skipped.
+        """
+        doc_ids = await self.async_vector_base.get_doc_ids_of_chat(session_id)
+        if not doc_ids:
+            return []
 
-        doc_ids = self.vector_base.get_doc_ids_of_chat(session_id)
-        for doc_id in doc_ids:
-            task = await self.document_handler.create_transcribe_task(user_id, doc_id)
+        tasks = await asyncio.gather(*[
+            self.document_handler.create_transcribe_task(user_id, doc_id)
+            for doc_id in doc_ids
+        ])
+        task_ids = [task.id for task in tasks]
+
+        statuses = await self._wait_for_transcriptions(task_ids)
+        succeeded_ids = [
+            task_id for task_id in task_ids
+            if statuses.get(task_id) == TranscriptionStatusEnum.SUCCESS.value
+        ]
+        if len(succeeded_ids) != len(task_ids):
+            logger.warning(
+                "Only %d of %d documents were transcribed for session %s",
+                len(succeeded_ids), len(task_ids), session_id
+            )
 
-            while True:
-                status = await self.document_handler.get_status(task.id)
-                if status.status == TranscriptionStatusEnum.SUCCESS:
-                    extracted_text: TranscriptionResponse = await self.document_handler.get_meta(task.id)
-                    extracted_texts.append(ExtractedDocument.model_validate(extracted_text.content))
-                    break
-                else:
-                    asyncio.sleep(5.0) # Wait for 5 seconds for the next ask
+        # Metadata filter is needed to get the content too
+        transcriptions: list[TranscriptionResponse] = await asyncio.gather(*[
+            self.document_handler.get_meta(task_id, meta_fields = ("source",))
+            for task_id in succeeded_ids
+        ])
+        extracted_texts = [
+            self._to_extracted_document(transcription)
+            for transcription in transcriptions
+        ]
 
         return extracted_texts
     
@@ -268,10 +434,12 @@ class Head:
         return result
     
 
-    def _prepare_text(self, session_id: str, message_id: str) -> str:
+    async def _prepare_text(self, session_id: str, message_id: str) -> str:
         # Load the text of message from vectorbase
-        text = self.get_message_by_id(session_id, message_id)
-        text: str = text["data"]["content"]
+        message = await self.get_message_by_id(session_id, message_id)
+        if message is None:
+            raise KeyError(f"There is no message {message_id} in session {session_id}")
+        text: str = message["data"]["content"]
 
         # Cut the think part if there is any
         if "<think>" in text:
@@ -283,7 +451,7 @@ class Head:
         return text
 
 
-    def formalize(
+    async def formalize(
         self, 
         session_id: str, 
         user_id: str,
@@ -297,16 +465,19 @@ class Head:
         """
         # Set the last message if there is no provided message_id
         if message_id is None:
-            message_id = self.get_last_message_id(session_id)
+            message_id = await self.get_last_message_id(session_id)
         
-        text = self._prepare_text(session_id, message_id)
+        text = await self._prepare_text(session_id, message_id)
 
-        user = self.find_user(user_id)
+        user = await self.find_user(user_id)
+        document_info = await self.get_extracted_info(session_id)
         
         # Actually formalization module work
-        docname = self.formalizer.formalize(
+        # It is LLM calls and docx writing, so it goes to a worker thread
+        docname = await asyncio.to_thread(
+            self.formalizer.formalize,
             user = user,
-            document_info = self.get_extracted_info(session_id),
+            document_info = document_info,
             text = text,
             doc_type = "docx",
             random_name = False
@@ -0,0 +1,40 @@
+import os
+import sys
+from typing import Callable
+
+import pytest
+
+# `src` package of the backend builds the whole application on import
+# (`HEAD` connects to databases), so tests import its subpackages directly.
+# Tests are run from the repository root, where `config/config.yaml` is
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from db_handle import history_cache
+
+
+class Clock:
+    """Fake time of `history_cache`, it goes forward only when `now` is changed"""
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(history_cache, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def make_item() -> Callable[..., dict]:
+    """Message of history as it is stored by `langchain`"""
+    def make_item(message_id: str, content: str = "text") -> dict:
+        return {
+            "type": "human",
+            "data": {"id": message_id, "content": content, "additional_kwargs": {}}
+        }
+
+    return make_item
@@ -0,0 +1,92 @@
+import pytest
+
+from db_handle.history_cache import MessageHistoryCache
+
+
+@pytest.fixture
+def cache() -> MessageHistoryCache:
+    return MessageHistoryCache(maxsize = 2)
+
+
+def test_miss_then_hit(cache: MessageHistoryCache, make_item):
+    assert cache.get("session") is None
+
+    cache.put("session", [make_item("1"), make_item("2")])
+
+    assert [item["data"]["id"] for item in cache.get("session")] == ["1", "2"]
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_returned_history_is_a_copy(cache: MessageHistoryCache, make_item):
+    items = [make_item("1")]
+    cache.put("session", items)
+    items[0]["data"]["content"] = "changed by writer"
+
+    cached = cache.get("session")
+    cached[0]["data"]["content"] = "changed by reader"
+
+    assert cache.get("session")[0]["data"]["content"] == "text"
+
+
+def test_least_recently_used_session_is_evicted(cache: MessageHistoryCache, make_item):
+    cache.put("first", [make_item("1")])
+    cache.put("second", [make_item("2")])
+    # Reading makes "first" the most recently used one
+    cache.get("first")
+    cache.put("third", [make_item("3")])
+
+    assert cache.get("second") is None
+    assert cache.get_message("second", "2") is None
+    assert cache.get("first") is not None
+    assert cache.get("third") is not None
+    assert cache.stats["sessions"] == 2
+
+
+def test_zero_maxsize_disables_cache(make_item):
+    cache = MessageHistoryCache(maxsize = 0)
+    cache.put("session", [make_item("1")])
+
+    assert cache.get("session") is None
+
+
+def test_append_updates_only_cached_session(cache: MessageHistoryCache, make_item):
+    cache.append("not cached", make_item("1"))
+    assert cache.get("not cached") is None
+
+    cache.put("session", [make_item("1")])
+    cache.append("session", make_item("2"))
+
+    assert cache.get_last_message_id("session") == "2"
+    assert cache.get_message("session", "2")["data"]["id"] == "2"
+
+
+def test_message_of_other_session_is_not_returned(cache: MessageHistoryCache, make_item):
+    cache.put("session", [make_item("1")])
+
+    assert cache.get_message("other session", "1") is None
+
+
+def test_update_parameter(cache: MessageHistoryCache, make_item):
+    cache.put("session", [make_item("1"), make_item("2")])
+
+    cache.update_parameter("2", "rating", "like")
+    # Unknown messages are ignored
+    cache.update_parameter("3", "rating", "dislike")
+
+    assert cache.get_message("session", "2")["data"]["additional_kwargs"] == {"rating": "like"}
+    assert cache.get_message("session", "1")["data"]["additional_kwargs"] == {}
+
+
+def test_invalidate_and_clear(cache: MessageHistoryCache, make_item):
+    cache.put("first", [make_item("1")])
+    cache.put("second", [make_item("2")])
+
+    cache.invalidate("first")
+    assert cache.get("first") is None
+    assert cache.get_message("first", "1") is None
+    assert cache.get("second") is not None
+
+    cache.clear()
+    assert cache.get("second") is None
+    assert cache.stats["sessions"] == 0
@@ -0,0 +1,52 @@
+import pytest
+
+from db_handle.history_cache import PendingWritesBuffer
+
+
+@pytest.fixture
+def buffer(clock) -> PendingWritesBuffer:
+    return PendingWritesBuffer(max_age = 5.0)
+
+
+def test_not_visible_messages_are_appended(buffer: PendingWritesBuffer, make_item):
+    buffer.add("session", make_item("2"))
+
+    merged = buffer.merge("session", [make_item("1")])
+
+    assert [item["data"]["id"] for item in merged] == ["1", "2"]
+    assert buffer.get_last_message_id("session") == "2"
+
+
+def test_visible_messages_leave_buffer(buffer: PendingWritesBuffer, make_item):
+    buffer.add("session", make_item("1"))
+    buffer.add("session", make_item("2"))
+
+    merged = buffer.merge("session", [make_item("1"), make_item("2")])
+
+    assert [item["data"]["id"] for item in merged] == ["1", "2"]
+    assert buffer.get_last_message_id("session") is None
+
+
+def test_sessions_are_separate(buffer: PendingWritesBuffer, make_item):
+    buffer.add("session", make_item("1"))
+
+    assert buffer.merge("other session", []) == []
+    assert buffer.get_last_message_id("other session") is None
+
+
+def test_old_messages_expire(buffer: PendingWritesBuffer, clock, make_item):
+    buffer.add("session", make_item("1"))
+    clock.now += 3
+    buffer.add("session", make_item("2"))
+    clock.now += 3
+
+    merged = buffer.merge("session", [])
+
+    assert [item["data"]["id"] for item in merged] == ["2"]
+
+
+def test_invalidate(buffer: PendingWritesBuffer, make_item):
+    buffer.add("session", make_item("1"))
+    buffer.invalidate("session")
+
+    assert buffer.merge("session", []) == []
@@ -2,6 +2,7 @@ import logging
 from fastapi import FastAPI
 from data_info_handler.document_handler.routes import files, transcribe
 from data_info_handler.document_handler.models.base import pg_handler
+from data_info_handler.document_handler.models.dbutils import migrate_tables
 from contextlib import asynccontextmanager
 
 
@@ -13,6 +14,7 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     logger.info("Creating tables")
     pg_handler.create_tables()
+    migrate_tables()
     logger.info("Created tables")
     yield
 
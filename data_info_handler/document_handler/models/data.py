@@ -6,6 +6,8 @@ from sqlalchemy.dialects.postgresql import BYTEA
 class Data(Base):
     __tablename__ = "data"
     md5sum: Mapped[bytes] = mapped_column(BYTEA(16), primary_key=True)
-    data: Mapped[bytes] = mapped_column(BYTEA)
+    # Content is kept by blob storage, column has contents saved before it.
+    # Deferred: loaded only when it is accessed or undeferred explicitly
+    data: Mapped[bytes | None] = mapped_column(BYTEA, nullable=True, deferred=True)
     file_type: Mapped[str]
     size_bytes: Mapped[int]
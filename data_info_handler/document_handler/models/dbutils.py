@@ -1,31 +1,71 @@
-from hashlib import md5
+import os
+import tempfile
+from contextlib import contextmanager
 from data_info_handler.document_handler.models.data import Data
 from data_info_handler.document_handler.models.files import File
 from data_info_handler.document_handler.models.transcriptions import Transcription
+from data_info_handler.document_handler.models.storage import blob_storage
 from uuid import UUID
 from datetime import datetime
+from typing import Iterator, NamedTuple
 from data_info_handler.document_handler.models.base import pg_handler
-from sqlalchemy import select, func
+from sqlalchemy import select, update, func, case, cast, text
+from sqlalchemy.dialects.postgresql import insert, JSONB
+from sqlalchemy.orm import undefer
 from gm_services.schemas.document_handler import UploadResponse, TranscriptionStatusEnum
 
 
-def add_data(file_data: bytes, content_type: str) -> bytes:
-    md5sum = md5(file_data)
-    with pg_handler.get_session() as session:
-        existing_data = session.get(Data, md5sum.digest())
-    if existing_data is not None:
-        return md5sum.digest()
-
-    data = Data(
-        md5sum=md5sum.digest(),
-        data=file_data,
-        file_type=content_type,
-        size_bytes=len(file_data),
-    )
+class FileDataSnapshot(NamedTuple):
+    md5sum: bytes | None
+    file_type: str | None
+
+
+class TranscriptionSnapshot(NamedTuple):
+    id: UUID
+    status: str
+    method: str | None
+    meta: dict
+    updated_at: datetime
+    # Loaded only on request, it is the whole transcribed text
+    content: dict | None = None
+
+
+_TRANSCRIPTION_COLUMNS = (
+    Transcription.id,
+    Transcription.status,
+    Transcription.method,
+    Transcription.meta,
+    Transcription.updated_at,
+)
+
+
+def migrate_tables() -> None:
+    """Bring tables created by older versions up to the current models"""
+    # create_all never alters existing tables, content of data moved to blob storage
+    # and the column is kept empty since, dropping NOT NULL twice is a no-op
+    with pg_handler.engine.begin() as connection:
+        connection.execute(text("ALTER TABLE data ALTER COLUMN data DROP NOT NULL"))
+
+
+def add_staged_data(
+    staged_path: str, md5sum: bytes, size_bytes: int, content_type: str
+) -> bytes:
+    """Save uploaded content from its staging file, the same content is stored once"""
     with pg_handler.get_session() as session:
-        session.add(data)
+        stmt = (
+            insert(Data)
+            .values(md5sum=md5sum, file_type=content_type, size_bytes=size_bytes)
+            .on_conflict_do_nothing(index_elements=[Data.md5sum])
+            .returning(Data.md5sum)
+        )
+        inserted = session.execute(stmt).scalar_one_or_none()
+        if inserted is None:
+            os.unlink(staged_path)
+        else:
+            # Row is committed only after content is stored
+            blob_storage.put(md5sum, staged_path)
 
-    return md5sum.digest()
+    return md5sum
 
 
 def add_file(user_id: str, filename: str, md5sum: bytes) -> tuple[UUID, datetime]:
@@ -49,30 +89,72 @@ def does_user_id_own_file_id(user_id: str, file_id: UUID) -> bool:
 
 def does_user_id_own_md5sum(user_id: str, md5sum: bytes) -> bool:
     with pg_handler.get_session() as session:
-        stmt = select(File).where(File.user_id == user_id and File.md5sum == md5sum)
-        existing_file = session.execute(stmt).scalar_one_or_none()
-        return existing_file is not None and existing_file.deleted_at is None
+        stmt = (
+            select(File.id)
+            .where(
+                File.user_id == user_id,
+                File.md5sum == md5sum,
+                File.deleted_at.is_(None),
+            )
+            .limit(1)
+        )
+        return session.execute(stmt).first() is not None
 
 
-def get_md5sum_by_id(file_id: UUID) -> bytes | None:
+def get_owned_file_data(user_id: str, file_id: UUID) -> FileDataSnapshot | None:
+    """md5sum and content type of user's file, None if user doesn't own such file"""
     with pg_handler.get_session() as session:
-        existing_file = session.get(File, file_id)
-        return (
-            existing_file.md5sum
-            if existing_file and existing_file.deleted_at is None
-            else None
+        stmt = (
+            select(File.md5sum, Data.file_type)
+            .outerjoin(Data, Data.md5sum == File.md5sum)
+            .where(
+                File.id == file_id,
+                File.user_id == user_id,
+                File.deleted_at.is_(None),
+            )
         )
+        row = session.execute(stmt).first()
+        return FileDataSnapshot(*row) if row else None
 
 
-def get_data_by_md5sum(md5sum: bytes) -> bytes | None:
+def _get_legacy_data_by_md5sum(md5sum: bytes) -> bytes | None:
+    """Content saved in `Data.data` before blob storage"""
     with pg_handler.get_session() as session:
-        existing_data = session.get(Data, md5sum)
-        return existing_data.data if existing_data else None
+        stmt = select(Data.data).where(Data.md5sum == md5sum)
+        return session.execute(stmt).scalar_one_or_none()
+
+
+def iter_data_by_md5sum(md5sum: bytes) -> Iterator[bytes] | None:
+    """Content by chunks, None if there is no such content"""
+    if blob_storage.exists(md5sum):
+        return blob_storage.iter_chunks(md5sum)
+
+    data = _get_legacy_data_by_md5sum(md5sum)
+    return None if data is None else iter([data])
+
+
+@contextmanager
+def data_path_by_md5sum(md5sum: bytes) -> Iterator[str | None]:
+    """Path to a local file with content, None if there is no such content"""
+    if blob_storage.exists(md5sum):
+        with blob_storage.local_path(md5sum) as path:
+            yield path
+        return
+
+    data = _get_legacy_data_by_md5sum(md5sum)
+    if data is None:
+        yield None
+        return
+
+    with tempfile.NamedTemporaryFile(prefix="data-") as legacy_file:
+        legacy_file.write(data)
+        legacy_file.flush()
+        yield legacy_file.name
 
 
 def get_upload_response_by_id(file_id: UUID) -> UploadResponse | None:
     with pg_handler.get_session() as session:
-        existing_file = session.get(File, file_id)
+        existing_file = session.get(File, file_id, options=[undefer(File.meta)])
         return (
             UploadResponse.model_validate(
                 existing_file, from_attributes=True, extra="ignore"
@@ -91,63 +173,109 @@ def delete_file_id(file_id: UUID) -> bool:
     return True
 
 
-def create_transcription_task(id: UUID, md5sum: bytes):
+def create_transcription_task(
+    id: UUID, md5sum: bytes, method: str
+) -> TranscriptionSnapshot:
     with pg_handler.get_session() as session:
-        t = Transcription(
-            id=id, status=TranscriptionStatusEnum.IN_QUEUE.value, md5sum=md5sum
+        stmt = (
+            insert(Transcription)
+            .values(
+                id=id,
+                status=TranscriptionStatusEnum.IN_QUEUE.value,
+                md5sum=md5sum,
+                method=method,
+                content={},
+                meta={},
+            )
+            .returning(*_TRANSCRIPTION_COLUMNS)
         )
-        session.add(t)
-
-
-def set_transcription_task_status(id: UUID, new_status: str) -> bool:
-    with pg_handler.get_session() as session:
-        existing_task = session.get(Transcription, id)
-        if existing_task is None:
-            return False
-        existing_task.status = new_status
-    return True
+        return TranscriptionSnapshot(*session.execute(stmt).one())
 
 
-def get_transcription_task_status(id: UUID) -> str | None:
-    with pg_handler.get_session() as session:
-        existing_task = session.get(Transcription, id)
-        return None if existing_task is None else existing_task.status
-
+def get_transcription_task(
+    id: UUID, with_content: bool = False
+) -> TranscriptionSnapshot | None:
+    """Everything about a task in one query, `content` is loaded only with `with_content`"""
+    columns = _TRANSCRIPTION_COLUMNS
+    if with_content:
+        columns = (*columns, Transcription.content)
 
-def get_transcription_content_type_by_md5sum(md5sum: bytes) -> str | None:
     with pg_handler.get_session() as session:
-        existing_data = session.get(Data, md5sum)
-        return existing_data.file_type if existing_data else None
+        row = session.execute(select(*columns).where(Transcription.id == id)).first()
+        return TranscriptionSnapshot(*row) if row else None
 
 
-def set_transcription_task_content(id: UUID, content: dict) -> bool:
+def get_finished_transcription(
+    md5sum: bytes, method: str
+) -> TranscriptionSnapshot | None:
+    """Latest successful transcription of the same data with the same method"""
     with pg_handler.get_session() as session:
-        existing_task = session.get(Transcription, id)
-        if existing_task is None:
-            return False
-        existing_task.content = content
-        return True
+        stmt = (
+            select(*_TRANSCRIPTION_COLUMNS)
+            .where(
+                Transcription.md5sum == md5sum,
+                Transcription.method == method,
+                Transcription.status == TranscriptionStatusEnum.SUCCESS.value,
+            )
+            .order_by(Transcription.updated_at.desc())
+            .limit(1)
+        )
+        row = session.execute(stmt).first()
+        return TranscriptionSnapshot(*row) if row else None
 
 
-def get_transcription_task_updated_at(id: UUID) -> datetime | None:
+def get_transcription_tasks_status(ids: list[UUID]) -> list[tuple[UUID, str, datetime]]:
+    """Status and updated_at of several tasks in one query, unknown ids are skipped"""
     with pg_handler.get_session() as session:
-        existing_task = session.get(Transcription, id)
-        return existing_task.updated_at if existing_task else None
+        stmt = select(
+            Transcription.id, Transcription.status, Transcription.updated_at
+        ).where(Transcription.id.in_(ids))
+        return [tuple(row) for row in session.execute(stmt).all()]
 
 
-def get_transcription_task_method(id: UUID) -> str | None:
+def get_transcription_content_type_by_md5sum(md5sum: bytes) -> str | None:
     with pg_handler.get_session() as session:
-        existing_task = session.get(Transcription, id)
-        return existing_task.method if existing_task else None
+        stmt = select(Data.file_type).where(Data.md5sum == md5sum)
+        return session.execute(stmt).scalar_one_or_none()
 
 
-def get_transcription_task_meta(id: UUID) -> dict:
+def _update_transcription_task(id: UUID, **values) -> bool:
+    """Update columns of a task without loading it, `updated_at` is set too"""
     with pg_handler.get_session() as session:
-        existing_task = session.get(Transcription, id)
-        return existing_task.meta if existing_task else dict()
+        stmt = (
+            update(Transcription)
+            .where(Transcription.id == id)
+            .values(**values, updated_at=func.now())
+        )
+        return session.execute(stmt).rowcount > 0
 
 
-def get_transcription_task_content(id: UUID) -> dict | None:
-    with pg_handler.get_session() as session:
-        existing_task = session.get(Transcription, id)
-        return existing_task.content if existing_task else None
+def set_transcription_task_status(id: UUID, new_status: str) -> bool:
+    return _update_transcription_task(id, status=new_status)
+
+
+def set_transcription_task_method(id: UUID, method: str) -> bool:
+    return _update_transcription_task(id, method=method)
+
+
+def set_transcription_task_progress(
+    id: UUID,
+    content: dict,
+    pages_done: int,
+    pages_total: int | None,
+    ocr_pages: list[int],
+) -> bool:
+    """
+    Save pages read so far and reading progress of a task,
+    `ocr_pages` are numbers of pages that were read with OCR
+    """
+    progress = cast(
+        {"pages_done": pages_done, "pages_total": pages_total, "ocr_pages": ocr_pages},
+        JSONB,
+    )
+    # Merged into meta by Postgres, so meta is not read first
+    meta = case(
+        (func.jsonb_typeof(Transcription.meta) == "object", Transcription.meta),
+        else_=cast({}, JSONB),
+    ).op("||")(progress)
+    return _update_transcription_task(id, content=content, meta=meta)
@@ -17,7 +17,8 @@ class File(Base):
         ForeignKey("data.md5sum", ondelete="RESTRICT"),
         nullable=True,
     )
-    meta: Mapped[dict] = mapped_column(JSONB)
+    # Not needed by ownership checks, loaded only on access or with `undefer`
+    meta: Mapped[dict] = mapped_column(JSONB, deferred=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
@@ -0,0 +1,11 @@
+from sqlalchemy.orm import mapped_column, Mapped
+from sqlalchemy.dialects.postgresql import BYTEA, OID
+from data_info_handler.document_handler.models.base import Base
+
+
+class LargeObject(Base):
+    """Postgres large object that keeps the content with this md5sum"""
+
+    __tablename__ = "large_objects"
+    md5sum: Mapped[bytes] = mapped_column(BYTEA(16), primary_key=True)
+    oid: Mapped[int] = mapped_column(OID, nullable=False)
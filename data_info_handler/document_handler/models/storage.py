@@ -0,0 +1,234 @@
+"""
+Content-addressed storage of uploaded file contents.
+
+Contents are never loaded whole: uploads are streamed to a staging file
+while md5sum is computed, downloads are read by chunks, and readers get
+a path to a local file. `Data` rows keep only metadata of the content.
+"""
+
+import os
+import asyncio
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from hashlib import md5
+from typing import AsyncIterator, Iterator
+
+from sqlalchemy import select
+
+from data_info_handler.document_handler.models.base import pg_handler
+from data_info_handler.document_handler.models.large_objects import LargeObject
+from gm_services.config import Settings
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStorage(ABC):
+    def __init__(self, chunk_size: int) -> None:
+        self.chunk_size = chunk_size
+
+    @property
+    def staging_dir(self) -> str | None:
+        """Directory for files being uploaded, None - system temp directory"""
+        return None
+
+    async def receive(self, chunks: AsyncIterator[bytes]) -> tuple[str, bytes, int]:
+        """
+        Write stream of chunks to a staging file
+
+        Returns
+        -------
+        staged: tuple[str, bytes, int]
+            Path to the staging file, md5sum and size of the content.
+            Staging file must be passed to `put` or removed.
+        """
+        md5sum = md5()
+        size = 0
+        fd, path = tempfile.mkstemp(dir=self.staging_dir, prefix="upload-")
+        try:
+            with os.fdopen(fd, "wb") as staging_file:
+
+                def consume(chunk: bytes) -> None:
+                    md5sum.update(chunk)
+                    staging_file.write(chunk)
+
+                async for chunk in chunks:
+                    # Hashing and disk writes of a chunk are done off the event loop
+                    await asyncio.to_thread(consume, chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.unlink(path)
+            raise
+
+        return path, md5sum.digest(), size
+
+    @abstractmethod
+    def exists(self, md5sum: bytes) -> bool: ...
+
+    @abstractmethod
+    def put(self, md5sum: bytes, staged_path: str) -> None:
+        """Save content of the staging file, staging file is consumed"""
+
+    @abstractmethod
+    def iter_chunks(self, md5sum: bytes) -> Iterator[bytes]: ...
+
+    @abstractmethod
+    @contextmanager
+    def local_path(self, md5sum: bytes) -> Iterator[str]:
+        """Path to a local file with the content, valid inside the context"""
+
+    @abstractmethod
+    def delete(self, md5sum: bytes) -> None: ...
+
+
+class FileSystemBlobStorage(BlobStorage):
+    """Contents are files named by md5sum hex in `root`"""
+
+    def __init__(self, root: str, chunk_size: int) -> None:
+        super().__init__(chunk_size)
+        self.root = root
+        # Staging files are on the same filesystem, so they are moved by rename
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+    @property
+    def staging_dir(self) -> str:
+        return os.path.join(self.root, "staging")
+
+    def _path(self, md5sum: bytes) -> str:
+        md5_hex = md5sum.hex()
+        return os.path.join(self.root, md5_hex[:2], md5_hex)
+
+    def exists(self, md5sum: bytes) -> bool:
+        return os.path.exists(self._path(md5sum))
+
+    def put(self, md5sum: bytes, staged_path: str) -> None:
+        path = self._path(md5sum)
+        if os.path.exists(path):
+            os.unlink(staged_path)
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(staged_path, path)
+
+    def iter_chunks(self, md5sum: bytes) -> Iterator[bytes]:
+        with open(self._path(md5sum), "rb") as blob:
+            while chunk := blob.read(self.chunk_size):
+                yield chunk
+
+    @contextmanager
+    def local_path(self, md5sum: bytes) -> Iterator[str]:
+        yield self._path(md5sum)
+
+    def delete(self, md5sum: bytes) -> None:
+        try:
+            os.unlink(self._path(md5sum))
+        except FileNotFoundError:
+            pass
+
+
+class LargeObjectBlobStorage(BlobStorage):
+    """Contents are Postgres large objects, `large_objects` table maps md5sum to oid"""
+
+    def _oid(self, md5sum: bytes) -> int | None:
+        with pg_handler.get_session() as session:
+            stmt = select(LargeObject.oid).where(LargeObject.md5sum == md5sum)
+            return session.execute(stmt).scalar_one_or_none()
+
+    def exists(self, md5sum: bytes) -> bool:
+        return self._oid(md5sum) is not None
+
+    def put(self, md5sum: bytes, staged_path: str) -> None:
+        try:
+            if self.exists(md5sum):
+                return
+
+            connection = pg_handler.engine.raw_connection()
+            try:
+                large_object = connection.lobject(0, "wb")
+                with open(staged_path, "rb") as staged:
+                    while chunk := staged.read(self.chunk_size):
+                        large_object.write(chunk)
+                large_object.close()
+
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "INSERT INTO large_objects (md5sum, oid) VALUES (%s, %s)"
+                        " ON CONFLICT (md5sum) DO NOTHING",
+                        (md5sum, large_object.oid),
+                    )
+                    # Other upload of the same content won the race
+                    if cursor.rowcount == 0:
+                        connection.lobject(large_object.oid, "wb").unlink()
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+            finally:
+                connection.close()
+        finally:
+            os.unlink(staged_path)
+
+    def iter_chunks(self, md5sum: bytes) -> Iterator[bytes]:
+        oid = self._oid(md5sum)
+        if oid is None:
+            raise FileNotFoundError(md5sum.hex())
+
+        connection = pg_handler.engine.raw_connection()
+        try:
+            large_object = connection.lobject(oid, "rb")
+            while chunk := large_object.read(self.chunk_size):
+                yield chunk
+            large_object.close()
+            connection.commit()
+        finally:
+            connection.close()
+
+    @contextmanager
+    def local_path(self, md5sum: bytes) -> Iterator[str]:
+        oid = self._oid(md5sum)
+        if oid is None:
+            raise FileNotFoundError(md5sum.hex())
+
+        fd, path = tempfile.mkstemp(prefix="blob-")
+        os.close(fd)
+        try:
+            connection = pg_handler.engine.raw_connection()
+            try:
+                # Export is done by client library straight into the file
+                connection.lobject(oid, "rb").export(path)
+                connection.commit()
+            finally:
+                connection.close()
+            yield path
+        finally:
+            os.unlink(path)
+
+    def delete(self, md5sum: bytes) -> None:
+        oid = self._oid(md5sum)
+        if oid is None:
+            return
+
+        connection = pg_handler.engine.raw_connection()
+        try:
+            connection.lobject(oid, "wb").unlink()
+            with connection.cursor() as cursor:
+                cursor.execute("DELETE FROM large_objects WHERE md5sum = %s", (md5sum,))
+            connection.commit()
+        finally:
+            connection.close()
+
+
+def create_blob_storage() -> BlobStorage:
+    settings = Settings.services.document_handler
+    match settings.blob_storage:
+        case "filesystem":
+            return FileSystemBlobStorage(settings.blob_storage_path, settings.blob_chunk_size)
+        case "large_object":
+            return LargeObjectBlobStorage(settings.blob_chunk_size)
+        case _:
+            raise ValueError(f"{settings.blob_storage} blob storage is not supported")
+
+
+blob_storage = create_blob_storage()
@@ -18,8 +18,9 @@ class Transcription(Base):
         ForeignKey("data.md5sum", ondelete="CASCADE"), index=True
     )
     method: Mapped[str | None]
-    content: Mapped[dict] = mapped_column(JSONB, default="{}")
-    meta: Mapped[dict] = mapped_column(JSONB, default="{}")
+    # Large JSONB columns are not loaded with the row, only on access or with `undefer`
+    content: Mapped[dict] = mapped_column(JSONB, default=dict, deferred=True)
+    meta: Mapped[dict] = mapped_column(JSONB, default=dict, deferred=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
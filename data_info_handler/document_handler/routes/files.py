@@ -1,15 +1,22 @@
-from fastapi import APIRouter, UploadFile, HTTPException, Response
+from fastapi import APIRouter, UploadFile, HTTPException
+from fastapi.responses import StreamingResponse
 from gm_services.schemas.document_handler import UploadResponse, FilterMetadataRequest
 from data_info_handler.document_handler.models import dbutils
+from data_info_handler.document_handler.models.storage import blob_storage
 from logging import getLogger
 from uuid import UUID
-from typing import cast
+from typing import AsyncIterator, cast
 
 logger = getLogger(__name__)
 
 router = APIRouter()
 
 
+async def _read_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await file.read(blob_storage.chunk_size):
+        yield chunk
+
+
 @router.post("/upload", response_model=UploadResponse)
 async def upload_file(user_id: str, file: UploadFile) -> UploadResponse:
     if not file.filename:
@@ -17,8 +24,9 @@ async def upload_file(user_id: str, file: UploadFile) -> UploadResponse:
     if not file.content_type:
         raise HTTPException(400, "Content-Type must be specified")
 
-    file_data = await file.read()
-    md5sum = dbutils.add_data(file_data, file.content_type)
+    # Content is streamed to storage by chunks, md5sum is computed on the way
+    staged_path, md5sum, size_bytes = await blob_storage.receive(_read_chunks(file))
+    md5sum = dbutils.add_staged_data(staged_path, md5sum, size_bytes, file.content_type)
     file_id, created_at = dbutils.add_file(user_id, file.filename, md5sum=md5sum)
 
     return UploadResponse(
@@ -38,24 +46,25 @@ async def get_data(user_id: str, id: UUID | None = None, md5sum: str | None = No
         raise HTTPException(400, "id or md5sum must be specified")
 
     if id:
-        if not dbutils.does_user_id_own_file_id(user_id, id):
+        file_data = dbutils.get_owned_file_data(user_id, id)
+        if file_data is None:
             raise HTTPException(403, "Forbidden")
 
-        md5sum_from_db = dbutils.get_md5sum_by_id(id)
+        md5sum_from_db = file_data.md5sum
         if md5sum_from_db is None:
             logger.error(
                 "User %s owns file %s, but can't retrieve it's md5sum", user_id, id
             )
             raise HTTPException(500, "Can't retrieve file with such id")
 
-        data = dbutils.get_data_by_md5sum(md5sum_from_db)
-        if not data:
+        chunks = dbutils.iter_data_by_md5sum(md5sum_from_db)
+        if chunks is None:
             logger.error(
                 "Can't find data for id=%s, md5sum=%s", id, md5sum_from_db.hex()
             )
             raise HTTPException(500, "Can't get data for this file")
 
-        return Response(data, media_type="binary/octet-stream")
+        return StreamingResponse(chunks, media_type="binary/octet-stream")
 
     md5sum = cast(str, md5sum)  # From here, only md5sum is specified
     try:
@@ -69,8 +78,8 @@ async def get_data(user_id: str, id: UUID | None = None, md5sum: str | None = No
     if not dbutils.does_user_id_own_md5sum(user_id, md5_bytes):
         raise HTTPException(403, "Forbidden")
 
-    data = dbutils.get_data_by_md5sum(md5_bytes)
-    if data is None:
+    chunks = dbutils.iter_data_by_md5sum(md5_bytes)
+    if chunks is None:
         logger.error(
             "User %s owns file with md5sum %s, but can't retrieve it's data",
             user_id,
@@ -78,7 +87,7 @@ async def get_data(user_id: str, id: UUID | None = None, md5sum: str | None = No
         )
         raise HTTPException(500, "Can't retrieve file data")
 
-    return Response(data, media_type="binary/octet-stream")
+    return StreamingResponse(chunks, media_type="binary/octet-stream")
 
 
 @router.post("/", response_model=UploadResponse)
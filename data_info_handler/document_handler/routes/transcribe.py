@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from gm_services.schemas.document_handler import (
     TranscriptionResponse,
     FilterMetadataRequest,
     TranscriptionStatusEnum,
     TransriptionStatusResponse,
+    TranscriptionStatusBatchRequest,
 )
 from uuid import UUID, uuid4
 from data_info_handler.document_handler.services.reader_tasks import reader_task
+from data_info_handler.document_handler.services.reader import Reader
+from data_info_handler.document_handler.services.notifications import watch_statuses
 from data_info_handler.document_handler.models import dbutils
 from logging import getLogger
 
@@ -16,75 +20,128 @@ router = APIRouter()
 
 
 @router.post("/", response_model=TransriptionStatusResponse)
-async def post_task(user_id: str, file_id: UUID):
-    if not dbutils.does_user_id_own_file_id(user_id, file_id):
+async def post_task(user_id: str, file_id: UUID, force: bool = False):
+    """
+    Create a transcription task for the file
+
+    Transcriptions are content-addressed: if the same data was already
+    transcribed with the same method, that task is returned right away.
+    `force` skips this and always reads the file again.
+    """
+    file_data = dbutils.get_owned_file_data(user_id, file_id)
+    if file_data is None:
         raise HTTPException(403, "Forbidden")
 
-    logger.info("Getting md5sum by file_id %s", file_id)
-    md5sum = dbutils.get_md5sum_by_id(file_id)
+    md5sum, content_type = file_data
     if md5sum is None:
         logger.warning("No md5sum for file %s", file_id)
         raise HTTPException(500, f"No data for file {file_id}")
 
-    task_id = uuid4()
-    dbutils.create_transcription_task(task_id, md5sum)
-    reader_task.apply_async(args=[file_id, md5sum], task_id=str(task_id))
+    if content_type is None:
+        logger.warning("No content_type for file %s", file_id)
+        raise HTTPException(500, f"No content_type for file {file_id}")
+    method = Reader.detect_method(content_type)
 
-    logger.info("Created task %s", task_id)
+    if not force:
+        finished = dbutils.get_finished_transcription(md5sum, method)
+        if finished is not None:
+            logger.info("Reusing transcription %s for file %s", finished.id, file_id)
+            return TransriptionStatusResponse(
+                id=finished.id, status=finished.status, updated_at=finished.updated_at
+            )
 
-    status = dbutils.get_transcription_task_status(task_id)
-    if not status:
-        logger.error("Can't retrieve status for task %s", task_id)
-        raise HTTPException(500, f"No status for task {task_id}")
+    task = dbutils.create_transcription_task(uuid4(), md5sum, method)
+    # Every parsing method has its own queue and workers
+    reader_task.apply_async(args=[file_id, md5sum], task_id=str(task.id), queue=method)
 
-    updated_at = dbutils.get_transcription_task_updated_at(task_id)
-    if not updated_at:
-        logger.error("Can't retrieve updated_at for task %s", task_id)
-        raise HTTPException(500, f"No updated_at for task {task_id}")
+    logger.info("Created task %s", task.id)
 
-    return TransriptionStatusResponse(id=task_id, status=status, updated_at=updated_at)
+    return TransriptionStatusResponse(
+        id=task.id, status=task.status, updated_at=task.updated_at
+    )
 
 
 @router.get("/status", response_model=TransriptionStatusResponse)
 async def get_status(id: UUID):
-    status = dbutils.get_transcription_task_status(id)
-    if status is None:
+    task = dbutils.get_transcription_task(id)
+    if task is None:
         raise HTTPException(404, "No such task")
 
-    updated_at = dbutils.get_transcription_task_updated_at(id)
-    if updated_at is None:
-        raise HTTPException(500, "Can't fetch updated_at")
+    return TransriptionStatusResponse(
+        id=id, status=task.status, updated_at=task.updated_at
+    )
+
+
+@router.post("/status/batch", response_model=list[TransriptionStatusResponse])
+async def get_status_batch(body: TranscriptionStatusBatchRequest):
+    """Statuses of several tasks in one call, unknown ids are omitted"""
+    if not body.ids:
+        return []
+
+    return [
+        TransriptionStatusResponse(id=id, status=status, updated_at=updated_at)
+        for id, status, updated_at in dbutils.get_transcription_tasks_status(body.ids)
+    ]
 
-    return TransriptionStatusResponse(id=id, status=status, updated_at=updated_at)
+
+@router.get("/status/events")
+async def get_status_events(
+    ids: list[UUID] = Query(), timeout: float = Query(default=900.0, gt=0)
+):
+    """
+    Server-sent events with statuses of tasks
+
+    Current status of every task is sent first, then each transition of it.
+    Stream is closed when all tasks are finished or after `timeout` seconds.
+    """
+
+    async def events():
+        async for status in watch_statuses(ids, timeout):
+            yield f"data: {status.model_dump_json()}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 
 @router.post("/meta/", response_model=TranscriptionResponse)
-async def get_meta(id: UUID, body: FilterMetadataRequest | None = None):
-    status = dbutils.get_transcription_task_status(id)
-    if status is None:
+async def get_meta(
+    id: UUID, body: FilterMetadataRequest | None = None, partial: bool = False
+):
+    """
+    Result of a task
+
+    With `partial` pages that are already read are returned while the task
+    is still processing, `meta` has `pages_done` and `pages_total` progress.
+    `meta.ocr_pages` lists pages that were read with OCR (for "pdf" method
+    these are pages without a usable text layer).
+    """
+    # Content is the biggest column, it is loaded only when it is returned
+    task = dbutils.get_transcription_task(id, with_content=body is not None)
+    if task is None:
         raise HTTPException(404, "No such task")
 
-    if status not in (
+    ready_statuses = [
         TranscriptionStatusEnum.SUCCESS.value,
         TranscriptionStatusEnum.ERROR.value,
-    ):
+    ]
+    if partial:
+        ready_statuses.append(TranscriptionStatusEnum.PROCESSING.value)
+
+    if task.status not in ready_statuses:
         raise HTTPException(400, "Not ready yet")
 
-    method = dbutils.get_transcription_task_method(id)
-    if method is None:
+    if task.method is None:
         raise HTTPException(500, "No method for task")
 
-    meta = dbutils.get_transcription_task_meta(id)
+    meta = task.meta
     if body is None:
         meta = {key: meta[key] for key in meta if key in meta}
         return TranscriptionResponse(
-            id=id, status=status, method=method, meta=meta, content={}
+            id=id, status=task.status, method=task.method, meta=meta, content={}
         )
 
-    content = dbutils.get_transcription_task_content(id)
-    if content is None:
+    if task.content is None:
         raise HTTPException(500, "Content is None")
 
     return TranscriptionResponse(
-        id=id, status=status, method=method, meta=meta, content=content
+        id=id, status=task.status, method=task.method, meta=meta, content=task.content
     )
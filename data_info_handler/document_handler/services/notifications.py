@@ -0,0 +1,115 @@
+"""
+Transcription status notifications through Redis pub/sub.
+
+Celery signal handlers publish every status transition of a task to its own
+channel, API subscribes to these channels and streams transitions to clients,
+so nobody has to poll Postgres to learn that a task is finished.
+"""
+
+import asyncio
+import json
+from datetime import datetime, timezone
+from os import environ
+from typing import AsyncIterator
+from uuid import UUID
+
+import redis
+import redis.asyncio as aioredis
+
+from data_info_handler.document_handler.models import dbutils
+from gm_services.schemas.document_handler import (
+    TranscriptionStatusEnum,
+    TransriptionStatusResponse,
+)
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+REDIS_URI = environ["REDIS_URI"]
+
+FINISHED_STATUSES = (
+    TranscriptionStatusEnum.SUCCESS.value,
+    TranscriptionStatusEnum.ERROR.value,
+)
+
+_redis: redis.Redis | None = None
+_aioredis: aioredis.Redis | None = None
+
+
+def status_channel(task_id: UUID | str) -> str:
+    return f"transcription:status:{task_id}"
+
+
+def _get_redis() -> redis.Redis:
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(REDIS_URI)
+    return _redis
+
+
+def _get_aioredis() -> aioredis.Redis:
+    global _aioredis
+    if _aioredis is None:
+        _aioredis = aioredis.Redis.from_url(REDIS_URI)
+    return _aioredis
+
+
+def publish_status(task_id: UUID, status: str) -> None:
+    """
+    Publish status transition of a task, used by Celery worker
+
+    Notification is best effort: status is already saved to Postgres,
+    so subscribers that missed it will read it from there.
+    """
+    message = TransriptionStatusResponse(
+        id=task_id, status=status, updated_at=datetime.now(timezone.utc)
+    )
+    try:
+        _get_redis().publish(status_channel(task_id), message.model_dump_json())
+    except redis.RedisError as e:
+        logger.warning("Can't publish status of task %s: %s", task_id, e)
+
+
+async def watch_statuses(
+    ids: list[UUID], timeout: float
+) -> AsyncIterator[TransriptionStatusResponse]:
+    """
+    Yield current status of every task and then each transition of it,
+    until all tasks are finished or `timeout` seconds passed.
+    """
+    pubsub = _get_aioredis().pubsub()
+    # Subscribe before reading Postgres, so no transition is lost in between
+    await pubsub.subscribe(*[status_channel(id) for id in ids])
+    try:
+        pending = set(ids)
+        # Synchronous SQLAlchemy session, it must not block the event loop
+        current = await asyncio.to_thread(dbutils.get_transcription_tasks_status, ids)
+        for id, status, updated_at in current:
+            yield TransriptionStatusResponse(id=id, status=status, updated_at=updated_at)
+            if status in FINISHED_STATUSES:
+                pending.discard(id)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                logger.info("Stopped watching unfinished tasks %s", pending)
+                break
+
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=remaining
+            )
+            if message is None:
+                continue
+
+            status = TransriptionStatusResponse.model_validate(
+                json.loads(message["data"])
+            )
+            yield status
+            if status.status in FINISHED_STATUSES:
+                pending.discard(status.id)
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
@@ -1,5 +1,8 @@
-from io import BytesIO
+from typing import Iterator, NamedTuple
+import re
+import unicodedata
 import docx
+import pypdfium2
 
 from gm_services.config import Settings
 from gm_services.schemas.extraction import PARSING_METHODS, Page
@@ -11,40 +14,214 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+DOCX_CONTENT_TYPES = (
+    "application/msword",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+)
+
+# Control, private use, unassigned and surrogate characters of broken text layers
+UNREADABLE_CATEGORIES = ("Cc", "Co", "Cn", "Cs")
+
+# Separator that marker puts before every page with `paginate_output`: "{page_id}---...---"
+PAGE_SEPARATOR = re.compile(r"\s*\{(\d+)\}-{48}\s*")
+
+
+class PagesChunk(NamedTuple):
+    pages: list[Page]
+    # Number of pages processed so far
+    pages_done: int
+    # Numbers of pages of the chunk that were read with OCR
+    ocr_pages: list[int]
+
 
 class Reader:
-    converter = PdfConverter(
-        artifact_dict=create_model_dict(device=Settings.system.device)
-    )
+    """
+    Readers take a path to a local file, so PDFs are opened
+    from disk page by page instead of being copied to memory
+    """
+
+    # Marker models are loaded only by processes that run OCR,
+    # and shared by converters of all page ranges
+    models: dict | None = None
+    converter: PdfConverter | None = None
 
     def __init__(self):
         raise TypeError(f"{self.__class__.__name__} is non-initable")
 
+    @classmethod
+    def load_models(cls) -> None:
+        """Load marker models, does nothing if they are already loaded"""
+        if cls.models is not None:
+            return
+
+        logger.info("Loading marker models on %s", Settings.system.device)
+        cls.models = create_model_dict(device=Settings.system.device)
+        cls.converter = PdfConverter(artifact_dict=cls.models)
+
     @staticmethod
     def detect_method(content_type: str) -> PARSING_METHODS:
         if content_type.startswith("text/"):
             return "none"
-        if content_type == "application/msword":
+        if content_type in DOCX_CONTENT_TYPES:
             return "docx"
+        if content_type == "application/pdf":
+            return "pdf"
         return "ocr"
 
+    @staticmethod
+    def text_layer_quality(text: str) -> float:
+        """
+        Share of readable characters in PDF text layer,
+        0 if there is too little text to trust it (scanned page)
+        """
+        chars = "".join(text.split())
+        if len(chars) < Settings.services.document_handler.text_layer_min_chars:
+            return 0.0
+
+        unreadable = sum(
+            char == "\ufffd" or unicodedata.category(char) in UNREADABLE_CATEGORIES
+            for char in chars
+        )
+        return 1 - unreadable / len(chars)
+
     @classmethod
-    def read(cls, data: bytes, method: PARSING_METHODS) -> Page | None:
+    def read(cls, path: str, method: PARSING_METHODS) -> Page | None:
         match method:
-            case "ocr":
-                return cls._ocr(data)
+            case "ocr" | "pdf":
+                return cls._ocr(path)
             case "docx":
-                return cls._docx(data)
+                return cls._docx(path)
             case "none":
-                return cls._none(data)
+                return cls._none(path)
             case _:
                 raise TypeError(f"{method} is not supported")
 
+    @staticmethod
+    def count_pages(path: str, method: PARSING_METHODS) -> int | None:
+        """
+        Number of pages of PDF document, 1 for documents that are read whole
+        (docx, text), None if an "ocr" or "pdf" file can't be opened as PDF (an image)
+        """
+        if method not in ("ocr", "pdf"):
+            return 1
+        try:
+            pdf = pypdfium2.PdfDocument(path)
+        except pypdfium2.PdfiumError:
+            return None
+
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    @classmethod
+    def read_pages(
+        cls, path: str, method: PARSING_METHODS, pages_per_chunk: int
+    ) -> Iterator[PagesChunk | None]:
+        """
+        Read document by chunks of `pages_per_chunk` pages
+
+        Yields pages of every chunk together with the number of pages
+        processed so far, or None if the chunk can't be read.
+        Only PDF documents are chunked, anything else is one chunk.
+        """
+        if method == "pdf":
+            yield from cls._read_pdf_pages(path, pages_per_chunk)
+            return
+
+        pages_total = cls.count_pages(path, method)
+        if method != "ocr" or pages_total is None:
+            page = cls.read(path, method)
+            ocr_pages = [page.number] if page is not None and method == "ocr" else []
+            yield None if page is None else PagesChunk([page], 1, ocr_pages)
+            return
+
+        for start in range(0, pages_total, pages_per_chunk):
+            page_range = list(range(start, min(start + pages_per_chunk, pages_total)))
+            pages = cls._ocr_page_range(path, page_range)
+            yield None if pages is None else PagesChunk(
+                pages, page_range[-1] + 1, [page.number for page in pages]
+            )
+
+    @classmethod
+    def _read_pdf_pages(
+        cls, path: str, pages_per_chunk: int
+    ) -> Iterator[PagesChunk | None]:
+        """
+        Take text of PDF pages from the text layer,
+        only pages without a usable text layer are read by OCR
+        """
+        try:
+            pdf = pypdfium2.PdfDocument(path)
+        except pypdfium2.PdfiumError as e:
+            logger.exception("Exception while opening PDF: %s", e)
+            yield None
+            return
+
+        min_quality = Settings.services.document_handler.text_layer_min_quality
+        try:
+            pages_total = len(pdf)
+            for start in range(0, pages_total, pages_per_chunk):
+                page_range = list(range(start, min(start + pages_per_chunk, pages_total)))
+
+                pages: dict[int, Page] = {}
+                ocr_range = []
+                for page_id in page_range:
+                    text = pdf[page_id].get_textpage().get_text_range()
+                    if cls.text_layer_quality(text) >= min_quality:
+                        pages[page_id] = Page(number=page_id + 1, text=text)
+                    else:
+                        ocr_range.append(page_id)
+
+                ocr_pages = []
+                if ocr_range:
+                    logger.info("Pages %s have no usable text layer, reading them with OCR", ocr_range)
+                    ocr_pages = cls._ocr_page_range(path, ocr_range)
+                    if ocr_pages is None:
+                        yield None
+                        return
+                    pages.update({page.number - 1: page for page in ocr_pages})
+
+                yield PagesChunk(
+                    [pages[page_id] for page_id in sorted(pages)],
+                    page_range[-1] + 1,
+                    [page.number for page in ocr_pages],
+                )
+        finally:
+            pdf.close()
+
+    @classmethod
+    def _ocr_page_range(cls, path: str, page_range: list[int]) -> list[Page] | None:
+        cls.load_models()
+        converter = PdfConverter(
+            artifact_dict=cls.models,
+            config={"page_range": page_range, "paginate_output": True},
+        )
+        try:
+            rendered = converter(path)
+            text, _, images = text_from_rendered(rendered)
+        except Exception as e:
+            logger.exception("Exception while reading OCR data of pages %s: %s", page_range, e)
+            return None
+
+        if text is None:
+            return None
+
+        # ["", page_id, text, page_id, text, ...]
+        parts = PAGE_SEPARATOR.split(text)
+        if len(parts) == 1:
+            return [Page(number=page_range[0] + 1, text=text.strip())]
+
+        return [
+            Page(number=int(page_id) + 1, text=page_text)
+            for page_id, page_text in zip(parts[1::2], parts[2::2])
+        ]
+
     @classmethod
-    def _ocr(cls, data: bytes) -> Page | None:
-        data_io = BytesIO(data)
+    def _ocr(cls, path: str) -> Page | None:
+        cls.load_models()
         try:
-            rendered = cls.converter(data_io)
+            rendered = cls.converter(path)
             text, _, images = text_from_rendered(rendered)
         except Exception as e:
             logger.exception("Exception while reading OCR data: %s", e)
@@ -55,10 +232,9 @@ class Reader:
         return Page(number=1, text=text)
 
     @staticmethod
-    def _docx(data: bytes) -> Page | None:
-        data_io = BytesIO(data)
+    def _docx(path: str) -> Page | None:
         try:
-            document = docx.Document(data_io)
+            document = docx.Document(path)
         except Exception as e:
             logger.exception("Exception while reading docx data: %s", e)
             return None
@@ -66,9 +242,10 @@ class Reader:
         return Page(number=1, text=text)
 
     @staticmethod
-    def _none(data: bytes) -> Page | None:
+    def _none(path: str) -> Page | None:
         try:
-            text = data.decode()
+            with open(path, "rb") as text_file:
+                text = text_file.read().decode()
         except UnicodeDecodeError as e:
             logger.exception("Exception while decoding text data: %s", e)
             return None
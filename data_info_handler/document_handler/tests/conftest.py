@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Services are imported as `data_info_handler.document_handler...`,
+# tests are run from the repository root, where `config/config.yaml` is
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", ".."))
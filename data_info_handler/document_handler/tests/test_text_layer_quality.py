@@ -0,0 +1,38 @@
+import pytest
+
+from gm_services.config import Settings
+from data_info_handler.document_handler.services.reader import Reader
+
+
+@pytest.fixture(autouse=True)
+def min_chars(monkeypatch: pytest.MonkeyPatch) -> int:
+    monkeypatch.setattr(Settings.services.document_handler, "text_layer_min_chars", 10)
+    return 10
+
+
+def test_readable_text_layer():
+    assert Reader.text_layer_quality("Договор поставки №15 от 01.02.2024") == 1.0
+
+
+def test_too_short_text_layer_is_not_trusted():
+    assert Reader.text_layer_quality("Стр. 1") == 0.0
+    assert Reader.text_layer_quality("") == 0.0
+
+
+def test_whitespace_is_not_counted():
+    # 9 characters without whitespace is below the minimum
+    assert Reader.text_layer_quality("a b c d e f g h i\n\n\t   ") == 0.0
+    assert Reader.text_layer_quality("abcde \n\n fghij") == 1.0
+
+
+def test_unreadable_characters_lower_quality():
+    # Replacement, control and private use characters of broken font encodings
+    text = "abcdefgh" + "\ufffd" + "\x07" + "\ue000" + "ij"
+
+    assert Reader.text_layer_quality(text) == pytest.approx(10 / 13)
+
+
+def test_broken_text_layer_is_below_threshold():
+    text = "\ufffd" * 20 + "Договор"
+
+    assert Reader.text_layer_quality(text) < Settings.services.document_handler.text_layer_min_quality
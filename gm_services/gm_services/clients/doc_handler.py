@@ -4,6 +4,7 @@ import gm_services.schemas.document_handler as schemas
 from gm_services.config import Settings
 
 from uuid import UUID
+from typing import AsyncIterator, BinaryIO
 
 
 class DocumentHandlerClient:
@@ -13,8 +14,13 @@ class DocumentHandlerClient:
         )
 
     async def files_upload(
-        self, user_id: str, file_data: bytes, content_type: str, filename: str
+        self,
+        user_id: str,
+        file_data: bytes | BinaryIO,
+        content_type: str,
+        filename: str,
     ) -> schemas.UploadResponse:
+        # File-like objects are sent by httpx in chunks, without reading them whole
         r = await self.client.post(
             "/files/upload/",
             params={"user_id": user_id},
@@ -31,7 +37,7 @@ class DocumentHandlerClient:
 
         params = {"id": str(id)} if id else {"md5sum": str(md5sum)}
         params["user_id"] = user_id
-        r = await self.client.get("/files/data/", params=params)
+        r = await self.client.post("/files/data/", params=params)
         r.raise_for_status()
         return await r.aread()
 
@@ -53,9 +59,9 @@ class DocumentHandlerClient:
         r.raise_for_status()
 
     async def create_transcribe_task(
-        self, user_id: str, file_id: UUID
+        self, user_id: str, file_id: UUID, force: bool = False
     ) -> schemas.TransriptionStatusResponse:
-        params = {"user_id": user_id, "file_id": str(file_id)}
+        params = {"user_id": user_id, "file_id": str(file_id), "force": force}
         r = await self.client.post("/transcribe/", params=params)
         r.raise_for_status()
         return schemas.TransriptionStatusResponse.model_validate(r.json())
@@ -66,10 +72,44 @@ class DocumentHandlerClient:
         r.raise_for_status()
         return schemas.TransriptionStatusResponse.model_validate(r.json())
 
+    async def get_statuses(
+        self, ids: list[UUID]
+    ) -> list[schemas.TransriptionStatusResponse]:
+        body = schemas.TranscriptionStatusBatchRequest(ids=ids)
+        r = await self.client.post(
+            "/transcribe/status/batch", json=body.model_dump(mode="json")
+        )
+        r.raise_for_status()
+        return [
+            schemas.TransriptionStatusResponse.model_validate(status)
+            for status in r.json()
+        ]
+
+    async def watch_statuses(
+        self, ids: list[UUID], timeout: float
+    ) -> AsyncIterator[schemas.TransriptionStatusResponse]:
+        """
+        Statuses of tasks pushed by document handler as server-sent events:
+        current status of every task first, then each transition of it.
+        Stream ends when all tasks are finished or after `timeout` seconds.
+        """
+        params = {"ids": [str(id) for id in ids], "timeout": timeout}
+        # Events could be minutes apart, server closes the stream itself
+        stream_timeout = httpx.Timeout(5.0, read=timeout + 5.0)
+        async with self.client.stream(
+            "GET", "/transcribe/status/events", params=params, timeout=stream_timeout
+        ) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if line.startswith("data: "):
+                    yield schemas.TransriptionStatusResponse.model_validate_json(
+                        line.removeprefix("data: ")
+                    )
+
     async def get_meta(
-        self, id: UUID, meta_fields: tuple[str] | None
+        self, id: UUID, meta_fields: tuple[str] | None, partial: bool = False
     ) -> schemas.TranscriptionResponse:
-        params = {"id": str(id)}
+        params = {"id": str(id), "partial": partial}
         body = schemas.FilterMetadataRequest(meta=meta_fields) if meta_fields else None
         if body:
             r = await self.client.post(
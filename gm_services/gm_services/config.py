@@ -77,9 +77,26 @@ class AllIndexes(BaseModel):
     prompt_library: str
     context: str
 
+# How chat history writes become searchable:
+#   none - no refresh, fresh writes are served from in-process buffer
+#   wait_for - request waits for the next scheduled refresh
+#   force - forced refresh on every write
+HISTORY_WRITE_MODE_TYPE = Literal["none", "wait_for", "force"]
+
 class Vectorbase(BaseService):
     certs_path: str
     indexes: AllIndexes
+    # Number of chat sessions which parsed history is kept in memory
+    history_cache_size: int = 256
+    history_write_mode: HISTORY_WRITE_MODE_TYPE = "none"
+    # Seconds to keep not refreshed history writes in memory
+    pending_writes_max_age: float = 30.0
+    # Shared client connection pool
+    pool_maxsize: int = 10
+    keep_alive: bool = True
+    timeout: int = 30
+    # Actions per `_bulk` request
+    bulk_chunk_size: int = 500
 
 
 class Graphbase(BaseService):
@@ -91,11 +108,58 @@ class LLmEngine(BaseService):
 
 
 class Tablebase(BaseService):
-    pass
+    # Connections of PGHandler pool, callers wait if all of them are busy
+    pool_minconn: int = 1
+    pool_maxconn: int = 10
+    # Users, positions and checked credentials are cached for that long (seconds), 0 - no cache
+    user_cache_ttl: float = 300.0
+    user_cache_size: int = 1024
+
+
+READER_QUEUE_TYPE = Literal["ocr", "pdf", "docx", "none"]
+BLOB_STORAGE_TYPE = Literal["filesystem", "large_object"]
+
+
+class ReaderWorker(BaseModel):
+    # Forked worker processes of the queue
+    concurrency: int = 1
+    # Process is replaced after its resident memory grows over this (KiB), null - never
+    max_memory_per_child: int | None = None
+    # Tasks reserved by one process in advance
+    prefetch_multiplier: int = 1
+    # Load OCR models before tasks come. On cpu they are loaded once before the pool is forked
+    # and shared by workers copy-on-write, on cuda every worker process loads them after the fork.
+    # Otherwise every process loads them when it needs OCR the first time
+    preload_models: bool = False
 
 
 class ServiceOfDocuments(BaseService):
-    pass
+    # Files of one batch that are uploaded at the same time
+    upload_concurrency: int = 4
+    # Wait for status transitions pushed by document handler instead of polling
+    status_notifications: bool = True
+    # Transcription status polling (fallback): first interval, backoff limit and total wait (seconds)
+    status_poll_interval: float = 0.5
+    status_poll_max_interval: float = 5.0
+    transcription_timeout: float = 900.0
+    # Where contents of uploaded files are kept: files named by md5sum or Postgres large objects
+    blob_storage: BLOB_STORAGE_TYPE = "filesystem"
+    blob_storage_path: str = "data/blobs"
+    # Bytes read or written at once when files are streamed
+    blob_chunk_size: int = 1024 * 1024
+    # PDF pages that are read by OCR at once and saved together
+    ocr_pages_per_chunk: int = 4
+    # PDF page text layer is used if it has that many non-space characters
+    # and that share of them is readable, otherwise the page goes to OCR
+    text_layer_min_chars: int = 32
+    text_layer_min_quality: float = 0.9
+    # Reader worker settings for every parsing method queue
+    workers: dict[READER_QUEUE_TYPE, ReaderWorker] = {
+        "ocr": ReaderWorker(preload_models=True),
+        "pdf": ReaderWorker(concurrency=2),
+        "docx": ReaderWorker(concurrency=2),
+        "none": ReaderWorker(concurrency=2),
+    }
 
 class RetrieverService(BaseService):
     pass
@@ -128,10 +192,53 @@ class SomeApiSettings(BaseModel):
     host: str
 
 
+EMBEDDINGS_BACKEND_TYPE = Literal["torch", "onnx"]
+
+
+class EmbeddingsModelSettings(BaseModel):
+    # onnx - int8 ONNX Runtime export for CPU, exported once to `{onnx_path}/{model_name}`
+    backend: EMBEDDINGS_BACKEND_TYPE = "torch"
+    onnx_path: str = "data/onnx_models"
+    # Threads of one ONNX forward pass, 0 - all cores
+    num_threads: int = 0
+    # Texts are padded to the nearest of these lengths in tokens
+    length_buckets: list[int] = [32, 64, 128, 256, 512]
+    # Export is rejected if its cosine similarity to the full-precision model is lower
+    min_cosine_similarity: float = 0.98
+    # Expected RAM of the loaded model, memory is freed for it before loading
+    memory_mb: int = 4096
+
+
+class EmbeddingsApiSettings(SomeApiSettings):
+    # Texts per `/embed` request, longer batches are split by the client
+    batch_size: int = 64
+    # Requests of one call that are sent at the same time
+    max_concurrency: int = 4
+    # Shared client connection pool
+    pool_maxsize: int = 10
+    timeout: float = 120.0
+    # Ask for raw float32 vectors instead of JSON
+    binary_format: bool = True
+    # Service coalesces concurrent requests into one forward pass of up to
+    # `batch_size` texts, waiting for more requests at most this many seconds
+    max_batch_wait: float = 0.01
+    # Requests waiting for a forward pass, service answers 503 above it
+    max_queue_size: int = 1024
+    # Service cache of embeddings: vectors in memory (0 - disabled),
+    # directory of the on-disk tier (None - disabled) and its size for every model
+    cache_size: int = 20000
+    disk_cache_path: str | None = None
+    disk_cache_max_rows: int = 2_000_000
+    # Inference backend of every model, models that are not listed use defaults
+    models: dict[EMBEDDINGS_MODEL_TYPE, EmbeddingsModelSettings] = {}
+    # Models are loaded on first use, least recently used ones are unloaded above it
+    memory_budget_mb: int = 8192
+
+
 class ListOfApi(SomeApiSettings):
     main_back: SomeApiSettings
     document_handler: SomeApiSettings
-    embeddings_model: SomeApiSettings
+    embeddings_model: EmbeddingsApiSettings
     retriever: SomeApiSettings
 
 
@@ -1,5 +1,13 @@
 import os
+import csv
+import hmac
+import asyncio
+from hashlib import sha256
 import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
+from contextlib import contextmanager
+from threading import BoundedSemaphore
 
 from .table_schemas.password import PASSWORDTABLE
 from .table_schemas.user import USER
@@ -7,99 +15,266 @@ from .table_schemas.user_position import USERPOSITIONTABLE
 from .table_schemas.position import POSITIONTABLE
 from ...config import Settings
 
-from .table_schemas.password import PassTable
 from .table_schemas.user import User
 from .table_schemas.base import BaseTable
+from .ttl_cache import TTLCache, MISSING
+from typing import Iterator
 
 import logging
 logger = logging.getLogger(__name__)
 
 
+class PreparedConnection(psycopg2.extensions.connection):
+    """Connection that remembers which statements were prepared on it"""
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.prepared: set[str] = set()
+
+
+# Lookups of every websocket authorization and formalization,
+# prepared once per pooled connection. Parameters are $1, $2, ...
+PREPARED_STATEMENTS = {
+    "check_password": (
+        f"SELECT EXISTS (SELECT 1 FROM {PASSWORDTABLE.name} "
+        f"WHERE user_id = $1 AND password = $2)"
+    ),
+    "find_user": (
+        f"SELECT {', '.join(field.name for field in USER.fields)} "
+        f"FROM {USER.name} WHERE id = $1"
+    ),
+    "find_user_position": (
+        f"SELECT {POSITIONTABLE.name}.name "
+        f"FROM {USERPOSITIONTABLE.name} "
+        f"INNER JOIN {POSITIONTABLE.name} "
+        f"ON {USERPOSITIONTABLE.name}.position_id = {POSITIONTABLE.name}.id "
+        f"WHERE {USERPOSITIONTABLE.name}.user_id = $1"
+    )
+}
+
+
 class PGHandler:
+    """
+    Thread-safe pool of Postgres connections.
+
+    Sync methods block only the calling thread, `a`-prefixed methods
+    run them in a worker thread so the event loop is not blocked.
+    """
     def __init__(self) -> None:
-        self.pgs = psycopg2.connect(
+        settings = Settings.services.tablebase
+
+        self.pool = ThreadedConnectionPool(
+            minconn = settings.pool_minconn,
+            maxconn = settings.pool_maxconn,
             database = os.environ["POSTGRES_DB_NAME"],
             user = os.environ["POSTGRES_USER"],
             password = os.environ["POSTGRES_PASSWORD"],
-            host = Settings.services.tablebase.base_url,
-            port = 5432
+            host = settings.base_url,
+            port = 5432,
+            connection_factory = PreparedConnection
         )
-    
+        # Pool raises if it is exhausted, so callers wait for a free connection here
+        self._available = BoundedSemaphore(settings.pool_maxconn)
+
+        # User directory is tiny and almost static, but it is read on every
+        # authorization and formalization. Misses are not cached.
+        self.users = TTLCache(ttl = settings.user_cache_ttl, maxsize = settings.user_cache_size)
+        self.positions = TTLCache(ttl = settings.user_cache_ttl, maxsize = settings.user_cache_size)
+        # Digest of the last password that matched, not the password itself
+        self.credentials = TTLCache(ttl = settings.user_cache_ttl, maxsize = settings.user_cache_size)
+
+
+    @contextmanager
+    def _connection(self) -> Iterator[PreparedConnection]:
+        """Pooled connection, transaction is commited on exit or rolled back on error"""
+        with self._available:
+            connection: PreparedConnection = self.pool.getconn()
+            try:
+                yield connection
+                connection.commit()
+            except BaseException:
+                # Connection state is unknown after an error (even prepared statements),
+                # so it is not returned to the pool
+                self.pool.putconn(connection, close = True)
+                raise
+            else:
+                self.pool.putconn(connection)
+
 
     def _execute_sql(
-        self, 
+        self,
         query: str,
+        params: tuple | None = None,
         need_to_return: bool = False
     ) -> None | list[tuple]:
-        cursor = self.pgs.cursor()
-        cursor.execute(query)
-        
-        # Return all rows if needed to return something
-        if need_to_return:
-            return cursor.fetchall()
-        
-        # Commit changes to database if they were
-        self.pgs.commit()
-        
-        cursor.close()
+        with self._connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
+
+                # Return all rows if needed to return something
+                if need_to_return:
+                    return cursor.fetchall()
+
         logger.info("Query was commited successfully")
 
 
+    def _execute_prepared(self, name: str, params: tuple) -> list[tuple]:
+        """Execute one of `PREPARED_STATEMENTS`, preparing it on this connection if needed"""
+        with self._connection() as connection:
+            with connection.cursor() as cursor:
+                if name not in connection.prepared:
+                    cursor.execute(f"PREPARE {name} AS {PREPARED_STATEMENTS[name]}")
+                    connection.prepared.add(name)
+
+                placeholders = ", ".join(["%s"] * len(params))
+                cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+                return cursor.fetchall()
+
+
+    @staticmethod
+    def _credential_digest(user_id: str, user_password: str) -> bytes:
+        return sha256(f"{user_id}\0{user_password}".encode()).digest()
+
+
     def check_password(self, user_id: str, user_password: str) -> bool:
-        try:
-            query = f"SELECT * FROM {PASSWORDTABLE.name} "
-            query += f"WHERE user_id='{user_id}'"
+        digest = self._credential_digest(user_id, user_password)
+        cached_digest = self.credentials.get(user_id)
+        if cached_digest is not MISSING and hmac.compare_digest(cached_digest, digest):
+            return True
 
-            result = self._execute_sql(query, need_to_return = True)
-            result: PassTable = PASSWORDTABLE.transform_output(result)[0]
+        try:
+            [(is_match,)] = self._execute_prepared("check_password", (user_id, user_password))
 
-            if result.password == user_password:
-                return True
-            else:
-                return False
-        
         # If something went wrong - then password didn't match
-        except:
+        except Exception as err:
+            logger.warning("Could not check password of user %s: %s", user_id, err)
             return False
-    
 
-    def find_user(self, user_id: str, return_dict: bool = False) -> User | None:
+        # Wrong passwords always go to the database
+        if is_match:
+            self.credentials.put(user_id, digest)
+        return is_match
+
+
+    def find_user(self, user_id: str, return_dict: bool = False) -> User | dict | None:
         """Return `User` if there is a match, or `None` if nothing was found"""
+        user = self.users.get(user_id)
+        if user is MISSING:
+            try:
+                result = self._execute_prepared("find_user", (user_id,))
+                user = USER.transform_output(result)[0]
+            except Exception:
+                return None
+
+            self.users.put(user_id, user)
+
+        # Cached `User` is shared, so callers get their own copy
+        return user.model_dump() if return_dict else user.model_copy()
+
+
+    def find_user_position(self, user: User) -> str | None:
+        """Return position name if there is a match, or `None` if nothing was found"""
+        position = self.positions.get(user.key_id)
+        if position is not MISSING:
+            return position
+
         try:
-            query = f"SELECT * FROM {USER.name} "
-            query += f"WHERE id='{user_id}'"
-            result = self._execute_sql(query, need_to_return = True)
-
-            result: User = USER.transform_output(result, return_dict)[0]
-            return result
-        
-        except:
+            result = self._execute_prepared("find_user_position", (user.key_id,))
+            [(position,)] = result[:1]
+        except Exception:
             return None
 
+        self.positions.put(user.key_id, position)
+        return position
+
+
+    def invalidate_cache(self) -> None:
+        """Forget cached users, positions and credentials (after tables were changed)"""
+        self.users.invalidate()
+        self.positions.invalidate()
+        self.credentials.invalidate()
+
+
+    @property
+    def cache_stats(self) -> dict[str, dict[str, int]]:
+        return {
+            "users": self.users.stats,
+            "positions": self.positions.stats,
+            "credentials": self.credentials.stats
+        }
+
+
+    async def acheck_password(self, user_id: str, user_password: str) -> bool:
+        return await asyncio.to_thread(self.check_password, user_id, user_password)
+
+
+    async def afind_user(self, user_id: str, return_dict: bool = False) -> User | None:
+        return await asyncio.to_thread(self.find_user, user_id, return_dict)
+
 
     def create_table(self, table: BaseTable) -> None:
         command = table.create_command()
         self._execute_sql(command)
-    
 
-    def insert_values_to_table(self, table: BaseTable, values: dict) -> None:
-        for value in values:
-            command_for_insert_row = table.insert_values_command(value)
-            self._execute_sql(command_for_insert_row)
-    
 
-    def find_user_position(self, user: User) -> str:
-        """Return position name if there is a match, or `None` if nothing was found"""
-        try:
-            query = f"SELECT {USERPOSITIONTABLE.name}.user_id, {POSITIONTABLE.name}.name "
-            query += f"FROM {USERPOSITIONTABLE.name} "
-            query += f"INNER JOIN {POSITIONTABLE.name} "
-            query += f"ON {USERPOSITIONTABLE.name}.position_id={POSITIONTABLE.name}.id "
-            query += f"WHERE {USERPOSITIONTABLE.name}.user_id='{user.key_id}'"
-            result = self._execute_sql(query, need_to_return = True)
-
-            _, result = result[0]
-            return result
-        
-        except:
-            return None
+    def copy_csv_to_table(
+        self,
+        table: BaseTable,
+        path_to_file: str,
+        upsert: bool = False,
+        delimiter: str = ";"
+    ) -> int:
+        """
+        Stream `.csv` file to the table with `COPY ... FROM STDIN` in one transaction
+
+        Columns are taken from the header of the file, empty values become NULL.
+
+        Arguments
+        ---------
+        upsert: bool
+            Load rows to a temporary table first and merge them into `table`
+            (look at `BaseTable.upsert_from_command`), so loading can be repeated.
+            Otherwise rows are copied straight to `table`.
+
+        Returns
+        -------
+        rowcount: int
+            Number of inserted (or updated) rows
+        """
+        with open(path_to_file, encoding = "utf-8-sig", newline = "") as csv_file:
+            columns = next(csv.reader(csv_file, delimiter = delimiter))
+            unknown_columns = set(columns) - set(table._get_fields_names())
+            if unknown_columns:
+                raise ValueError(f"Columns {unknown_columns} are not in table {table.name}")
+            csv_file.seek(0)
+
+            names = ", ".join(columns)
+            copy_options = f"FORMAT csv, HEADER true, DELIMITER '{delimiter}'"
+
+            with self._connection() as connection:
+                with connection.cursor() as cursor:
+                    if not upsert:
+                        cursor.copy_expert(
+                            f"COPY {table.name} ({names}) FROM STDIN WITH ({copy_options})",
+                            csv_file
+                        )
+                        rowcount = cursor.rowcount
+
+                    else:
+                        staging = f"{table.name}_staging"
+                        cursor.execute(
+                            f"CREATE TEMP TABLE {staging} (LIKE {table.name}) ON COMMIT DROP"
+                        )
+                        cursor.copy_expert(
+                            f"COPY {staging} ({names}) FROM STDIN WITH ({copy_options})",
+                            csv_file
+                        )
+                        cursor.execute(table.upsert_from_command(staging, columns))
+                        rowcount = cursor.rowcount
+
+        logger.info("%d rows were loaded to %s", rowcount, table.name)
+        self.invalidate_cache()
+        return rowcount
+
+
+    def close(self) -> None:
+        self.pool.closeall()
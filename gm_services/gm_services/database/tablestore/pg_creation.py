@@ -3,7 +3,6 @@ from .table_schemas.password import PASSWORDTABLE
 from .table_schemas.position import POSITIONTABLE
 from .table_schemas.user_position import USERPOSITIONTABLE
 
-from ...common import pd_load_from_csv
 from .pg_connection import PGHandler
 
 from .table_schemas.base import BaseTable
@@ -15,21 +14,23 @@ logger = logging.getLogger(__name__)
 def create_table(
     table: BaseTable, 
     path_to_file: str,
-    tablestore: PGHandler | None = None
+    tablestore: PGHandler | None = None,
+    upsert: bool = True
 ) -> None:
+    """
+    Create table (if not exists) and load `.csv` file to it with `COPY`
+
+    With `upsert` existing rows are updated instead of duplicated,
+    so setup could be run again on the same database
+    """
     if tablestore is None:
         tablestore = PGHandler()
 
     # Create table
     tablestore.create_table(table)
 
-    # Load data from file
-    values_to_insert = pd_load_from_csv(path_to_file, index = False)
-    # Convert pd.Dataframe to list of rows (dict type)
-    values_to_insert = values_to_insert.to_dict(orient = "records")
-
-    # Insert values
-    tablestore.insert_values_to_table(table, values_to_insert)
+    # Stream values from file
+    tablestore.copy_csv_to_table(table, path_to_file, upsert = upsert)
 
 
 def create_users_table(path_to_file: str) -> bool:
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Literal, Any, Type
+from typing import Literal, Type
 
 
 VAR_TYPES = Literal[
@@ -71,41 +71,42 @@ class BaseTable(BaseModel):
         return command
 
 
-    def insert_values_command(self, values: dict[str, Any]) -> str:
+    def upsert_from_command(self, source: str, columns: list[str]) -> str:
         """
-        Make an SQL command for insertion in table
+        Make an SQL command that moves rows from `source` table to this one
+
+        Rows with existing primary key are updated. If the table has no
+        primary key, only rows that are not in the table yet are inserted.
 
         Arguments
         ---------
-        values: dict[str, Any]
-            This is a dictionary of row with keys as names of columns
-            and values as values of columns
+        source: str
+            Name of a table with the same columns (usually a temporary one)
+        columns: list[str]
+            Names of columns to move
 
         Returns
         -------
         command: str
             SQL query
         """
-        # Insert into specific table
-        command = f"INSERT INTO {self.name} ("
-
-        # Add column names
-        for key in values.keys():
-            command += f"{key}, "
-        # Remove last comma and close bracket
-        command = command[:-2] + ")\n"
-
-        # Add values of row
-        command += "VALUES ("
-        for key in values.keys():
-            value = values[key]
-            if isinstance(value, str):
-                value = f"'{value}'"
-
-            command += f"{value}, "
-        # Remove last comma and close bracket
-        command = command[:-2] + ")"
-
+        names = ", ".join(columns)
+        keys = [field.name for field in self.fields if field.primal_key]
+
+        if not keys:
+            command = f"INSERT INTO {self.name} ({names})\n"
+            command += f"SELECT {names} FROM {source}\n"
+            command += f"EXCEPT SELECT {names} FROM {self.name}"
+            return command
+
+        key_names = ", ".join(keys)
+        updates = [f"{column} = EXCLUDED.{column}" for column in columns if column not in keys]
+        conflict_action = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+
+        # One row per key, otherwise the same row would be updated twice
+        command = f"INSERT INTO {self.name} ({names})\n"
+        command += f"SELECT DISTINCT ON ({key_names}) {names} FROM {source}\n"
+        command += f"ON CONFLICT ({key_names}) {conflict_action}"
         return command
 
 
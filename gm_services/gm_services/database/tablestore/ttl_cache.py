@@ -0,0 +1,84 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+from typing import Any, Hashable
+
+
+# Returned by `TTLCache.get` when there is no fresh value, `None` could be a cached value
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe in-process cache with time-based expiry.
+
+    Entries live for `ttl` seconds after they were put. When there are more
+    than `maxsize` entries, the least recently used ones are evicted.
+
+    Arguments
+    ---------
+    ttl: float
+        Seconds to keep an entry. `0` disables the cache.
+    maxsize: int
+        Maximum number of entries.
+    """
+    def __init__(self, ttl: float, maxsize: int) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+
+        # key -> (expires_at, value)
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+
+    def get(self, key: Hashable) -> Any:
+        """Cached value, or `MISSING` if there is no fresh one"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return MISSING
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last = False)
+
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        """Drop one entry, or all of them if `key` is not provided"""
+        with self._lock:
+            self.invalidations += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """Hit/miss counters and current size of the cache"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "size": len(self._entries),
+            "maxsize": self.maxsize
+        }
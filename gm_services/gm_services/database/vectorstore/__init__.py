@@ -1,3 +1,8 @@
+from . import osdb_pool
+from . import osdb_extracted_info
 from . import osdb_connection
+from . import osdb_async_connection
 
-from .osdb_connection import OpenSearchConnection
\ No newline at end of file
+from .osdb_pool import get_opensearch_client, get_async_opensearch_client
+from .osdb_connection import OpenSearchConnection
+from .osdb_async_connection import AsyncOpenSearchConnection
\ No newline at end of file
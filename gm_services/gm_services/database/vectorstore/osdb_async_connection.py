@@ -0,0 +1,99 @@
+from opensearchpy.helpers import async_bulk
+
+from .osdb_pool import get_async_opensearch_client
+from .osdb_extracted_info import (
+    extracted_info_index,
+    create_extracted_info_request,
+    search_extracted_info_request,
+    first_hit,
+    extracted_info_of
+)
+from ...schemas.understanding import DocumentView
+
+from ...config import Settings
+from typing import Any
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class AsyncOpenSearchConnection:
+    """
+    Async twin of `OpenSearchConnection` for the code that runs inside event loop.
+
+    There is no vectorstore here: similarity search and documents loading
+    stay on the sync `OpenSearchConnection`.
+    """
+    def __init__(self) -> None:
+        # One client (and its bounded connection pool) is shared by the whole process
+        self.client = get_async_opensearch_client()
+
+    async def bulk(self, actions: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Send actions through `_bulk` API in chunks of `bulk_chunk_size`
+
+        Returns
+        -------
+        errors: list[dict[str, Any]]
+            Per-item errors of failed actions. Empty if everything was fine.
+        """
+        _, errors = await async_bulk(
+            client = self.client,
+            actions = actions,
+            chunk_size = Settings.services.vectorbase.bulk_chunk_size,
+            raise_on_error = False
+        )
+
+        for error in errors:
+            logger.error("Bulk action failed: %s", error)
+
+        return errors
+
+    async def update_document(
+        self,
+        index_name: str,
+        doc_id: str,
+        doc_body: dict[str, Any]
+    ) -> None:
+        await self.client.update(
+            index = index_name,
+            id = doc_id,
+            body = {"doc": doc_body}
+        )
+
+    # ------------------
+    # Save document data
+    # ------------------
+    async def add_extracted_info(self, session_id: str, extracted: DocumentView) -> None:
+        await self.client.create(**create_extracted_info_request(session_id, extracted))
+
+    async def _find_extracted_docview_with_metadata(self, session_id: str) -> dict | None:
+        try:
+            # Find a record of DocumentView for session_id
+            result = await self.client.search(**search_extracted_info_request(session_id))
+        # There are may be no documents
+        except Exception:
+            return None
+
+        return first_hit(result)
+
+    async def get_extracted_info(self, session_id: str) -> DocumentView | None:
+        """Get the saved DocumentView by session_id
+
+        Return None if there is no matching DocumentView
+        """
+        return extracted_info_of(await self._find_extracted_docview_with_metadata(session_id))
+
+    async def delete_extracted_info(self, session_id: str) -> None:
+        extracted_dict = await self._find_extracted_docview_with_metadata(session_id)
+        try:
+            extracted_id = extracted_dict["_id"]
+
+            await self.client.delete(index=extracted_info_index(), id=extracted_id)
+        except:
+            # If we can't delete - there is no recording to delete
+            # So we just log it, we can't delete anythings with this id
+            logger.info(
+                "There is no extracted info for this session_id = %s", session_id
+            )
+            pass
@@ -1,9 +1,19 @@
-import os
 from uuid import uuid4
-from opensearchpy import OpenSearch
+from opensearchpy import helpers
 from langchain_community.vectorstores import OpenSearchVectorSearch
 
-from ...common import generate_hex
+from .osdb_pool import (
+    get_opensearch_client,
+    create_index_if_not_exists,
+    forget_index
+)
+from .osdb_extracted_info import (
+    extracted_info_index,
+    create_extracted_info_request,
+    search_extracted_info_request,
+    first_hit,
+    extracted_info_of
+)
 from ...schemas.understanding import DocumentView
 
 from langchain_core.documents import Document
@@ -20,25 +30,8 @@ class BaseOpenSearchConnection:
         self, 
         embeddings_model_name: EMBEDDINGS_MODEL_TYPE | None = None
     ) -> None:
-        # Compatibility layer
-        address = Settings.services.vectorbase.base_url.split("//")[-1]
-        [host, port] = address.split(":")
-        available_hosts = [{"host": host, "port": port}]
-
-        auth = (
-            os.environ["OPENSEARCH_LOGIN"], 
-            os.environ["OPENSEARCH_PASSWORD"]
-        )
-
-        self.client = OpenSearch(
-            hosts = available_hosts,
-            http_compress = True, # enables gzip compression for request bodies
-            http_auth = auth,
-            use_ssl = True,
-            verify_certs = False,
-            ssl_assert_hostname = host,
-            ssl_show_warn = False
-        )
+        # One client (and its connection pool) is shared by the whole process
+        self.client = get_opensearch_client()
 
         # Because of implementation of original `OpenSearchVectorSearch` class,
         # that is connecting to OpenSearch database with the same credentials and
@@ -74,14 +67,42 @@ class BaseOpenSearchConnection:
         uuids = [str(uuid4()) for _ in range(n)]
         return uuids
 
+    def bulk(self, actions: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Send actions through `_bulk` API in chunks of `bulk_chunk_size`
+
+        Arguments
+        ---------
+        actions: list[dict[str, Any]]
+            Bulk actions in `opensearchpy.helpers.bulk` format, for example
+            `{"_op_type": "create", "_index": ..., "_id": ..., "_source": {...}}`
+
+        Returns
+        -------
+        errors: list[dict[str, Any]]
+            Per-item errors of failed actions. Empty if everything was fine.
+        """
+        _, errors = helpers.bulk(
+            client = self.client,
+            actions = actions,
+            chunk_size = Settings.services.vectorbase.bulk_chunk_size,
+            raise_on_error = False
+        )
+
+        for error in errors:
+            logger.error("Bulk action failed: %s", error)
+
+        return errors
+
     def delete_index(self, index_name: str) -> None:
         self.client.indices.delete(index = index_name)
+        forget_index(index_name)
     
     def add_documents(
         self, 
         docs: list[Document] | list[dict],
         index_name: str | None = None
-    ) -> None:
+    ) -> list[dict[str, Any]]:
         """
         Add document to VectorStore
 
@@ -100,24 +121,32 @@ class BaseOpenSearchConnection:
             If this documents *not* for a retriever, need to specify to what index
             we need to add this documents.  
             Defaults to *None* (documents _are_ for retriever by default)
+
+        Returns
+        -------
+        errors: list[dict[str, Any]]
+            Per-item errors of documents that were not added to custom `index_name`.
         """
         uuids = self._create_uuids(len(docs))
 
         if index_name is None:    
             self.vectorstore.add_documents(documents = docs, ids = uuids)
+            return []
         
-        else:
-            # Create index if doesn't exist
-            if not self.client.indices.exists(index = index_name):
-                self.client.indices.create(index = index_name)
-            
-            # One by one put documents to this index
-            for i, doc in enumerate(docs):
-                self.client.index(
-                    index = index_name,
-                    id = uuids[i],
-                    body = doc
-                )
+        # Create index if doesn't exist
+        create_index_if_not_exists(self.client, index_name)
+        
+        # Put documents to this index with bulk requests
+        actions = [
+            {
+                "_op_type": "index",
+                "_index": index_name,
+                "_id": uuid,
+                "_source": doc
+            }
+            for uuid, doc in zip(uuids, docs)
+        ]
+        return self.bulk(actions)
     
     def update_document(
         self, 
@@ -128,7 +157,7 @@ class BaseOpenSearchConnection:
         self.client.update(
             index = index_name,
             id = doc_id,
-            body = doc_body
+            body = {"doc": doc_body}
         )
 
 
@@ -144,56 +173,31 @@ class OpenSearchConnection(BaseOpenSearchConnection):
     # Save document data
     # ------------------
     def add_extracted_info(self, session_id: str, extracted: DocumentView) -> None:
-        # Make DocumentView dict-type
-        extracted_dict = extracted.model_dump(mode="python")
-        # Add session_id parameter
-        extracted_dict["session_id"] = session_id
-        # Create a record to the database
-        self.client.create(
-            index=Settings.services.vectorbase.indexes.documents,
-            id=generate_hex(8),
-            document=extracted_dict,
-        )
+        self.client.create(**create_extracted_info_request(session_id, extracted))
 
     def _find_extracted_docview_with_metadata(self, session_id: str) -> dict | None:
         try:
             # Find a record of DocumentView for session_id
-            result = self.client.search(
-                index=Settings.services.vectorbase.indexes.documents,
-                query={"term": {"session_id": session_id}},
-                size=1,
-            )
+            result = self.client.search(**search_extracted_info_request(session_id))
         # There are may be no documents
         except Exception:
             return None
 
-        if result and len(result["hits"]["hits"]) > 0:
-            extracted_dict = result["hits"]["hits"][0]
-            return extracted_dict
-
-        return None
+        return first_hit(result)
 
     def get_extracted_info(self, session_id: str) -> DocumentView | None:
         """Get the saved DocumentView by session_id
 
         Return None if there is no matching DocumentView
         """
-        extracted_dict = self._find_extracted_docview_with_metadata(session_id)
-        if extracted_dict is not None:
-            extracted_dict = extracted_dict["_source"]
-            extracted = DocumentView(**extracted_dict)
-            return extracted
-
-        return None
+        return extracted_info_of(self._find_extracted_docview_with_metadata(session_id))
 
     def delete_extracted_info(self, session_id: str) -> None:
         extracted_dict = self._find_extracted_docview_with_metadata(session_id)
         try:
             extracted_id = extracted_dict["_id"]
 
-            self.client.delete(
-                index=Settings.services.vectorbase.indexes.documents, id=extracted_id
-            )
+            self.client.delete(index=extracted_info_index(), id=extracted_id)
         except:
             # If we can't delete - there is no recording to delete
             # So we just log it, we can't delete anythings with this id
@@ -0,0 +1,54 @@
+"""
+Requests and responses of the extracted documents info (`DocumentView` of a session).
+
+Shared by `OpenSearchConnection` and `AsyncOpenSearchConnection`, so both of them
+store and find the record the same way and differ only by the client they call.
+"""
+
+from ...common import generate_hex
+from ...schemas.understanding import DocumentView
+
+from ...config import Settings
+from typing import Any
+
+
+def extracted_info_index() -> str:
+    return Settings.services.vectorbase.indexes.documents
+
+
+def create_extracted_info_request(session_id: str, extracted: DocumentView) -> dict[str, Any]:
+    """Arguments of `client.create` that saves `extracted` for `session_id`"""
+    # Make DocumentView dict-type
+    extracted_dict = extracted.model_dump(mode="python")
+    # Add session_id parameter
+    extracted_dict["session_id"] = session_id
+
+    return {
+        "index": extracted_info_index(),
+        "id": generate_hex(8),
+        "body": extracted_dict,
+    }
+
+
+def search_extracted_info_request(session_id: str) -> dict[str, Any]:
+    """Arguments of `client.search` that finds the record of `session_id`"""
+    return {
+        "index": extracted_info_index(),
+        "body": {"query": {"term": {"session_id": session_id}}},
+        "size": 1,
+    }
+
+
+def first_hit(result: dict[str, Any] | None) -> dict | None:
+    """Found record with its metadata (`_id`, `_source`), None if nothing is found"""
+    if result and len(result["hits"]["hits"]) > 0:
+        return result["hits"]["hits"][0]
+
+    return None
+
+
+def extracted_info_of(hit: dict | None) -> DocumentView | None:
+    if hit is None:
+        return None
+
+    return DocumentView(**hit["_source"])
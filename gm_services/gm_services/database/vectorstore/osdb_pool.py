@@ -0,0 +1,165 @@
+"""
+Process-wide registry of OpenSearch clients.
+
+`OpenSearch` client is thread-safe and holds its own pool of HTTP connections,
+so every module of one process should share the same instance instead of
+making a new client (and a new TLS handshake) for every call.
+"""
+
+import os
+from threading import Lock
+from opensearchpy import OpenSearch, AsyncOpenSearch, AsyncHttpConnection
+
+from ...config import Settings
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+_CLIENT: OpenSearch | None = None
+_CLIENT_LOCK = Lock()
+
+_ASYNC_CLIENT: AsyncOpenSearch | None = None
+
+# Names of indexes that are known to exist
+_EXISTING_INDEXES: set[str] = set()
+_INDEXES_LOCK = Lock()
+
+
+def opensearch_client_kwargs() -> dict:
+    """Connection parameters of OpenSearch client taken from Settings"""
+    # Compatibility layer
+    address = Settings.services.vectorbase.base_url.split("//")[-1]
+    [host, port] = address.split(":")
+    available_hosts = [{"host": host, "port": port}]
+
+    auth = (
+        os.environ["OPENSEARCH_LOGIN"],
+        os.environ["OPENSEARCH_PASSWORD"]
+    )
+
+    connection = "keep-alive" if Settings.services.vectorbase.keep_alive else "close"
+
+    return {
+        "hosts": available_hosts,
+        "http_compress": True, # enables gzip compression for request bodies
+        "http_auth": auth,
+        "use_ssl": True,
+        "verify_certs": False,
+        "ssl_assert_hostname": host,
+        "ssl_show_warn": False,
+        # Connection pool
+        "pool_maxsize": Settings.services.vectorbase.pool_maxsize,
+        "headers": {"Connection": connection},
+        "timeout": Settings.services.vectorbase.timeout
+    }
+
+
+def get_opensearch_client() -> OpenSearch:
+    """Return the shared OpenSearch client, create it on the first call"""
+    global _CLIENT
+
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                logger.info("Creating shared OpenSearch client")
+                _CLIENT = OpenSearch(**opensearch_client_kwargs())
+
+    return _CLIENT
+
+
+def get_async_opensearch_client() -> AsyncOpenSearch:
+    """
+    Return the shared AsyncOpenSearch client, create it on the first call
+
+    Pool of this client is bounded by the same `pool_maxsize` setting,
+    so slow queries wait for a free connection instead of opening new ones.
+    """
+    global _ASYNC_CLIENT
+
+    if _ASYNC_CLIENT is None:
+        logger.info("Creating shared AsyncOpenSearch client")
+        kwargs = opensearch_client_kwargs()
+        # aiohttp connection names this parameter differently
+        kwargs["maxsize"] = kwargs.pop("pool_maxsize")
+        _ASYNC_CLIENT = AsyncOpenSearch(
+            connection_class = AsyncHttpConnection,
+            **kwargs
+        )
+
+    return _ASYNC_CLIENT
+
+
+async def close_async_opensearch_client() -> None:
+    """Close connections of the shared AsyncOpenSearch client (on app shutdown)"""
+    global _ASYNC_CLIENT
+
+    if _ASYNC_CLIENT is not None:
+        await _ASYNC_CLIENT.close()
+        _ASYNC_CLIENT = None
+
+
+def index_exists(client: OpenSearch, index_name: str) -> bool:
+    """
+    Check if index exists.
+
+    Positive answers are memoized, so the check goes to OpenSearch
+    only until index is found (or created).
+    """
+    if index_name in _EXISTING_INDEXES:
+        return True
+
+    exists = client.indices.exists(index = index_name)
+    if exists:
+        remember_index(index_name)
+
+    return exists
+
+
+def create_index_if_not_exists(
+    client: OpenSearch,
+    index_name: str,
+    body: dict | None = None
+) -> None:
+    if index_exists(client, index_name):
+        return
+
+    logger.info("Creating index '%s'", index_name)
+    client.indices.create(index = index_name, body = body)
+    remember_index(index_name)
+
+
+async def aindex_exists(client: AsyncOpenSearch, index_name: str) -> bool:
+    """Async version of `index_exists`, shares the same memo"""
+    if index_name in _EXISTING_INDEXES:
+        return True
+
+    exists = await client.indices.exists(index = index_name)
+    if exists:
+        remember_index(index_name)
+
+    return exists
+
+
+async def acreate_index_if_not_exists(
+    client: AsyncOpenSearch,
+    index_name: str,
+    body: dict | None = None
+) -> None:
+    if await aindex_exists(client, index_name):
+        return
+
+    logger.info("Creating index '%s'", index_name)
+    await client.indices.create(index = index_name, body = body)
+    remember_index(index_name)
+
+
+def remember_index(index_name: str) -> None:
+    with _INDEXES_LOCK:
+        _EXISTING_INDEXES.add(index_name)
+
+
+def forget_index(index_name: str) -> None:
+    """Must be called after index deletion"""
+    with _INDEXES_LOCK:
+        _EXISTING_INDEXES.discard(index_name)
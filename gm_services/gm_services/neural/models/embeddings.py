@@ -1,39 +1,162 @@
-import requests
+import asyncio
+import httpx
+import numpy as np
+from threading import Lock
+from weakref import WeakKeyDictionary
+from concurrent.futures import ThreadPoolExecutor
 
 from ...config import Settings
 
 from langchain_core.embeddings import Embeddings
 from ...config import EMBEDDINGS_MODEL_TYPE
+from ...schemas.embeddings import (
+    EMBEDDINGS_BINARY_MEDIA_TYPE,
+    EmbeddingsRequest,
+    EmbeddingsResponse,
+    decode_embeddings
+)
+
+
+# Clients are shared by all `EmbeddingsCall` instances of the process,
+# so connections to the embeddings service are kept alive between calls
+_CLIENT: httpx.Client | None = None
+_CLIENT_LOCK = Lock()
+
+# `AsyncClient` connections belong to the event loop they were opened in
+_ASYNC_CLIENTS: WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = WeakKeyDictionary()
+
+
+def _client_kwargs() -> dict:
+    settings = Settings.api.embeddings_model
+    # Service that doesn't know binary format answers with JSON
+    accept = "application/json"
+    if settings.binary_format:
+        accept = f"{EMBEDDINGS_BINARY_MEDIA_TYPE}, application/json;q=0.5"
+
+    return {
+        "base_url": f"http://{settings.host}:{settings.port}",
+        "headers": {"Accept": accept},
+        "timeout": settings.timeout,
+        "limits": httpx.Limits(
+            max_connections = settings.pool_maxsize,
+            max_keepalive_connections = settings.pool_maxsize
+        )
+    }
+
+
+def _get_client() -> httpx.Client:
+    global _CLIENT
+
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = httpx.Client(**_client_kwargs())
+
+    return _CLIENT
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(**_client_kwargs())
+        _ASYNC_CLIENTS[loop] = client
+
+    return client
 
 
 class EmbeddingsCall(Embeddings):
+    """
+    Client of the embeddings service.
+
+    Texts are split into batches of `batch_size` (look at config), and up to
+    `max_concurrency` batches of one call are sent at the same time.
+
+    `embed_documents_array` / `aembed_documents_array` return the float32 matrix
+    of the response as is: for one batch in binary format it's a view of the
+    response body, without copying. Langchain methods convert it to lists.
+    """
     def __init__(self, model_name: EMBEDDINGS_MODEL_TYPE) -> None:
         self.model_name = model_name
 
-        self.host = Settings.api.embeddings_model.host
-        self.port = Settings.api.embeddings_model.port
-        self.address = f"http://{self.host}:{self.port}"
-
-
-    def _embed(self, texts: list[str]) -> list[list[float]]:
-        # Here is an api call
-        task_adress = self.address + "/embed"
-        task_params = {
-            "model_name": self.model_name,
-            "texts": texts
-        }
-        
-        result = requests.get(
-            url = task_adress,
-            params = task_params
-        )
-        result = result.json()
-        
-        return result
+        self.batch_size = Settings.api.embeddings_model.batch_size
+        self.max_concurrency = Settings.api.embeddings_model.max_concurrency
+
+
+    def _batches(self, texts: list[str]) -> list[list[str]]:
+        return [
+            texts[start:start + self.batch_size]
+            for start in range(0, len(texts), self.batch_size)
+        ]
+
+
+    def _request_body(self, texts: list[str]) -> dict:
+        return EmbeddingsRequest(model_name = self.model_name, texts = texts).model_dump()
+
+
+    @staticmethod
+    def _parse_response(response: httpx.Response) -> np.ndarray:
+        response.raise_for_status()
+        if response.headers.get("content-type", "").startswith(EMBEDDINGS_BINARY_MEDIA_TYPE):
+            return decode_embeddings(response.content)
+        embeddings = EmbeddingsResponse.model_validate_json(response.content).embeddings
+        return np.asarray(embeddings, dtype = np.float32)
+
+
+    @staticmethod
+    def _concatenate(results: list[np.ndarray]) -> np.ndarray:
+        # One batch is returned as is, so it stays a view of the response
+        if len(results) == 1:
+            return results[0]
+        return np.concatenate(results)
+
+
+    def _embed_batch(self, texts: list[str]) -> np.ndarray:
+        response = _get_client().post("/embed", json = self._request_body(texts))
+        return self._parse_response(response)
+
+
+    async def _aembed_batch(self, texts: list[str], semaphore: asyncio.Semaphore) -> np.ndarray:
+        async with semaphore:
+            response = await _get_async_client().post("/embed", json = self._request_body(texts))
+        return self._parse_response(response)
+
+
+    def embed_documents_array(self, texts: list[str]) -> np.ndarray:
+        """Embeddings of `texts` as float32 matrix (n_texts, dim)"""
+        if not texts:
+            return np.empty((0, 0), dtype = np.float32)
+
+        batches = self._batches(texts)
+        if len(batches) == 1:
+            return self._embed_batch(texts)
+
+        # `httpx.Client` is thread-safe, all threads share its connection pool
+        with ThreadPoolExecutor(max_workers = self.max_concurrency) as executor:
+            return self._concatenate(list(executor.map(self._embed_batch, batches)))
+
+
+    async def aembed_documents_array(self, texts: list[str]) -> np.ndarray:
+        """Embeddings of `texts` as float32 matrix (n_texts, dim)"""
+        if not texts:
+            return np.empty((0, 0), dtype = np.float32)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(*[
+            self._aembed_batch(batch, semaphore)
+            for batch in self._batches(texts)
+        ])
+        return self._concatenate(results)
 
 
     def embed_query(self, text: str) -> list[float]:
-        return self._embed([text])[0]
-    
+        return self.embed_documents_array([text])[0].tolist()
+
     def embed_documents(self, texts: list[str]) -> list[list[float]]:
-        return self._embed(texts)
+        return self.embed_documents_array(texts).tolist()
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents_array([text]))[0].tolist()
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return (await self.aembed_documents_array(texts)).tolist()
@@ -24,6 +24,17 @@ class UploadResponse(BaseModel):
                 raise ValidationError(f"Can't convert {type(md5sum)} to hex")
 
 
+class FileUploadResult(BaseModel):
+    """Result of uploading one file from a batch"""
+    filename: str
+    id: UUID4 | None = None
+    error: str | None = None
+
+    @property
+    def uploaded(self) -> bool:
+        return self.error is None
+
+
 class FilterMetadataRequest(BaseModel):
     meta: tuple[str]
 
@@ -41,6 +52,10 @@ class TransriptionStatusResponse(BaseModel):
     updated_at: AwareDatetime
 
 
+class TranscriptionStatusBatchRequest(BaseModel):
+    ids: list[UUID4]
+
+
 class TranscriptionResponse(BaseModel):
     id: UUID4
     status: str
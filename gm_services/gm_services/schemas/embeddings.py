@@ -0,0 +1,35 @@
+import struct
+import numpy as np
+from pydantic import BaseModel
+
+from ..config import EMBEDDINGS_MODEL_TYPE
+
+
+# Binary response of `/embed`: header of two little-endian uint32
+# (number of vectors and their dimension), then vectors as little-endian float32
+EMBEDDINGS_BINARY_MEDIA_TYPE = "application/x-embeddings-float32"
+_BINARY_HEADER = struct.Struct("<II")
+
+
+class EmbeddingsRequest(BaseModel):
+    model_name: EMBEDDINGS_MODEL_TYPE
+    texts: list[str]
+
+
+class EmbeddingsResponse(BaseModel):
+    embeddings: list[list[float]]
+
+
+def encode_embeddings(embeddings: np.ndarray) -> bytes:
+    """Matrix of embeddings (n_vectors, dim) to the binary format"""
+    embeddings = np.ascontiguousarray(embeddings, dtype = "<f4")
+    n_vectors, dim = embeddings.shape
+    return _BINARY_HEADER.pack(n_vectors, dim) + embeddings.tobytes()
+
+
+def decode_embeddings(content: bytes) -> np.ndarray:
+    """Matrix of embeddings (n_vectors, dim) that is a read-only view of `content`"""
+    n_vectors, dim = _BINARY_HEADER.unpack_from(content)
+    return np.frombuffer(
+        content, dtype = "<f4", count = n_vectors * dim, offset = _BINARY_HEADER.size
+    ).reshape(n_vectors, dim)
@@ -3,8 +3,8 @@ from typing import Literal
 
 
 PARSING_METHODS = Literal[
-    "ocr", "docx", "none"
-]  # none is for no parsing (of text, for example)
+    "ocr", "pdf", "docx", "none"
+]  # none is for no parsing (of text, for example), pdf is text layer with OCR fallback
 
 
 class Page(BaseModel):
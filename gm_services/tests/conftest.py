@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# Sources of the package are tested, not its installed copy.
+# Tests are run from the repository root, where `config/config.yaml` is
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from gm_services.database.tablestore import ttl_cache
+
+
+class Clock:
+    """Fake time of `ttl_cache`, it goes forward only when `now` is changed"""
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(ttl_cache, "monotonic", clock)
+    return clock
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from gm_services.schemas.embeddings import decode_embeddings, encode_embeddings
+
+
+def test_round_trip():
+    embeddings = np.arange(12, dtype = np.float32).reshape(3, 4) / 7
+
+    decoded = decode_embeddings(encode_embeddings(embeddings))
+
+    assert decoded.shape == (3, 4)
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, embeddings)
+
+
+def test_float64_is_sent_as_float32():
+    embeddings = np.array([[0.1, 0.2], [0.3, 0.4]], dtype = np.float64)
+
+    decoded = decode_embeddings(encode_embeddings(embeddings))
+
+    np.testing.assert_allclose(decoded, embeddings, rtol = 1e-6)
+
+
+def test_layout():
+    content = encode_embeddings(np.array([[1.0, 2.0]], dtype = np.float32))
+
+    # Header of (n_vectors, dim) as little-endian uint32, then little-endian float32
+    assert content == (
+        b"\x01\x00\x00\x00" + b"\x02\x00\x00\x00"
+        + b"\x00\x00\x80\x3f" + b"\x00\x00\x00\x40"
+    )
+
+
+def test_decoded_matrix_is_a_view_of_content():
+    content = encode_embeddings(np.ones((2, 3), dtype = np.float32))
+
+    decoded = decode_embeddings(content)
+
+    assert not decoded.flags.owndata
+    assert not decoded.flags.writeable
+
+
+def test_empty_batch():
+    decoded = decode_embeddings(encode_embeddings(np.empty((0, 1024), dtype = np.float32)))
+
+    assert decoded.shape == (0, 1024)
+
+
+def test_truncated_content_is_rejected():
+    content = encode_embeddings(np.ones((2, 3), dtype = np.float32))
+
+    with pytest.raises(ValueError):
+        decode_embeddings(content[:-4])
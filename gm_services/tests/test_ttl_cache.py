@@ -0,0 +1,65 @@
+from gm_services.database.tablestore.ttl_cache import TTLCache, MISSING
+
+
+def test_miss_then_hit(clock):
+    cache = TTLCache(ttl = 10, maxsize = 10)
+    assert cache.get("user") is MISSING
+
+    cache.put("user", {"name": "Ivan"})
+
+    assert cache.get("user") == {"name": "Ivan"}
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_none_is_a_cached_value(clock):
+    cache = TTLCache(ttl = 10, maxsize = 10)
+    cache.put("unknown user", None)
+
+    assert cache.get("unknown user") is None
+
+
+def test_entry_expires(clock):
+    cache = TTLCache(ttl = 10, maxsize = 10)
+    cache.put("user", 1)
+
+    clock.now += 9.9
+    assert cache.get("user") == 1
+
+    clock.now += 0.1
+    assert cache.get("user") is MISSING
+    assert cache.stats["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(ttl = 10, maxsize = 2)
+    cache.put("first", 1)
+    cache.put("second", 2)
+    # Reading makes "first" the most recently used one
+    cache.get("first")
+    cache.put("third", 3)
+
+    assert cache.get("second") is MISSING
+    assert cache.get("first") == 1
+    assert cache.get("third") == 3
+
+
+def test_zero_ttl_disables_cache(clock):
+    cache = TTLCache(ttl = 0, maxsize = 10)
+    cache.put("user", 1)
+
+    assert cache.get("user") is MISSING
+
+
+def test_invalidate(clock):
+    cache = TTLCache(ttl = 10, maxsize = 10)
+    cache.put("first", 1)
+    cache.put("second", 2)
+
+    cache.invalidate("first")
+    assert cache.get("first") is MISSING
+    assert cache.get("second") == 2
+
+    cache.invalidate()
+    assert cache.get("second") is MISSING
+    assert cache.stats["invalidations"] == 2
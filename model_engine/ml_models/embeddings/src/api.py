@@ -1,42 +1,108 @@
-from fastapi import FastAPI
+import numpy as np
+from fastapi import FastAPI, HTTPException, Header, Response
+from contextlib import asynccontextmanager
 
-from .emb_model import initialize_all_models
+from functools import partial
 
-from gm_services.config import EMBEDDINGS_MODEL_TYPE
+from .batching import QueueFullError
+from .cache import EmbeddingsCache
+from .registry import ModelRegistry, MB
+
+from gm_services.config import Settings, EMBEDDINGS_MODEL_TYPE
+from gm_services.schemas.embeddings import (
+    EMBEDDINGS_BINARY_MEDIA_TYPE,
+    EmbeddingsRequest,
+    EmbeddingsResponse,
+    encode_embeddings
+)
 
 import logging
 logger = logging.getLogger(__name__)
 
 
-logger.info("Initializing embedding models")
-ALL_EMBEDDINGS = initialize_all_models()
-logger.info("Embedding models was initialized")
+# Models are loaded on first use, concurrent requests to one model share its forward passes
+REGISTRY = ModelRegistry(memory_budget = Settings.api.embeddings_model.memory_budget_mb * MB)
+
+# Shared by all models, keys include the model name
+CACHE = EmbeddingsCache(
+    memory_size = Settings.api.embeddings_model.cache_size,
+    disk_path = Settings.api.embeddings_model.disk_cache_path,
+    disk_max_rows = Settings.api.embeddings_model.disk_cache_max_rows
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await REGISTRY.close()
 
-app = FastAPI()
 
-app.get("/embed")
+app = FastAPI(lifespan = lifespan)
+
+@app.post("/embed", response_model = EmbeddingsResponse)
 async def text_to_embeddgins(
-    model_name: EMBEDDINGS_MODEL_TYPE,
-    texts: list[str]
-) -> dict[str, list[list[float]]]:
+    request: EmbeddingsRequest,
+    accept: str | None = Header(default = None)
+) -> Response:
     """
     Transform batch of text to batch of embeedings via embeddings model
 
     Arguments
     ---------
-    model_name: Literal['FRIDA', 'e5-large']
+    request.model_name: Literal['FRIDA', 'e5-large']
         Model that will be used to generate embeddings
     
-    texts: list[str]
-        Batch of texts
+    request.texts: list[str]
+        Batch of texts, not longer than `batch_size` from config
+        (`EmbeddingsCall` splits longer batches by itself)
     
     Returns
     -------
-    result: dict[str, list[list[float]]]
-        {"embeddings": batch_of_embeddings}
+    result: EmbeddingsResponse | bytes
+        {"embeddings": batch_of_embeddings}, or float32 matrix
+        (look at `gm_services.schemas.embeddings.encode_embeddings`)
+        if client accepts `EMBEDDINGS_BINARY_MEDIA_TYPE`
+    """
+    max_batch_size = Settings.api.embeddings_model.batch_size
+    if len(request.texts) > max_batch_size:
+        raise HTTPException(
+            status_code = 413,
+            detail = f"Batch of {len(request.texts)} texts is longer than {max_batch_size}"
+        )
+
+    try:
+        # Model is not loaded if all texts are in cache
+        result = await CACHE.embed(
+            partial(REGISTRY.revision, request.model_name),
+            request.texts,
+            partial(REGISTRY.embed, request.model_name)
+        )
+    except QueueFullError as err:
+        raise HTTPException(status_code = 503, detail = str(err))
+
+    if accept is not None and EMBEDDINGS_BINARY_MEDIA_TYPE in accept:
+        matrix = np.stack(result) if result else np.empty((0, 0), dtype = np.float32)
+        return Response(content = encode_embeddings(matrix), media_type = EMBEDDINGS_BINARY_MEDIA_TYPE)
+
+    return EmbeddingsResponse(embeddings = [vector.tolist() for vector in result])
+
+
+@app.post("/models/{model_name}/warmup")
+async def warm_up_model(model_name: EMBEDDINGS_MODEL_TYPE) -> dict:
+    """Load the model (if it is not loaded) and run one forward pass"""
+    return await REGISTRY.warm_up(model_name)
+
+
+@app.get("/metrics")
+def get_metrics() -> dict[str, dict]:
+    """
+    Loaded models with their memory, queue depth and batch size histograms,
+    hit rate of the cache
     """
-    result = ALL_EMBEDDINGS.get(model_name).embed(texts)
-    return {"embeddings": result}
+    return {
+        "registry": REGISTRY.stats,
+        "cache": CACHE.stats
+    }
 
 
 @app.get("/")
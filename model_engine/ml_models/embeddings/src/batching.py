@@ -0,0 +1,182 @@
+"""
+Dynamic micro-batching of embeddings requests.
+
+Every request is put to the queue of its model. One worker per model takes
+requests from the queue until the batch is full or `max_wait` seconds passed,
+runs one forward pass for all of them on its own thread (so the event loop
+is never blocked) and scatters embeddings back to the requests.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+from .emb_model import EmbeddingsHandler
+from .metrics import Histogram
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class QueueFullError(Exception):
+    """Too many requests are waiting for a forward pass"""
+
+
+@dataclass
+class _PendingRequest:
+    texts: list[str]
+    future: asyncio.Future
+
+
+class MicroBatcher:
+    """
+    Arguments
+    ---------
+    handler: EmbeddingsHandler
+        Model to run forward passes with
+    max_batch_size: int
+        Maximum number of texts in one forward pass.
+        Request is never split, so it must not be longer than that.
+    max_wait: float
+        Seconds to wait for more requests after the first one of a batch
+    max_queue_size: int
+        Maximum number of requests waiting in the queue
+    """
+    def __init__(
+        self,
+        handler: EmbeddingsHandler,
+        max_batch_size: int,
+        max_wait: float,
+        max_queue_size: int
+    ) -> None:
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.queue: asyncio.Queue[_PendingRequest] = asyncio.Queue(maxsize = max_queue_size)
+        # Request that didn't fit into the previous batch
+        self._carry: _PendingRequest | None = None
+        self._worker: asyncio.Task | None = None
+        # Forward passes of one model go one after another
+        self._executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "embeddings")
+
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.requests_per_batch = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_depths = Histogram(QUEUE_DEPTH_BUCKETS)
+
+
+    def start(self) -> None:
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+
+    async def stop(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        self._executor.shutdown(wait = False, cancel_futures = True)
+
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+
+        self.start()
+        request = _PendingRequest(texts, asyncio.get_running_loop().create_future())
+        self.queue_depths.observe(self.queue.qsize())
+        try:
+            self.queue.put_nowait(request)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"{self.queue.qsize()} requests are already waiting")
+
+        return await request.future
+
+
+    async def _next_request(self, timeout: float | None) -> _PendingRequest:
+        if self._carry is not None:
+            request, self._carry = self._carry, None
+            return request
+
+        if timeout is None:
+            return await self.queue.get()
+        if not self.queue.empty():
+            return self.queue.get_nowait()
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+    async def _collect_batch(self) -> list[_PendingRequest]:
+        loop = asyncio.get_running_loop()
+
+        batch = [await self._next_request(timeout = None)]
+        size = len(batch[0].texts)
+        deadline = loop.time() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - loop.time()
+            # Requests that are already in the queue join without waiting
+            if remaining <= 0 and self.queue.empty():
+                break
+
+            try:
+                request = await self._next_request(timeout = max(remaining, 0))
+            except asyncio.TimeoutError:
+                break
+
+            if size + len(request.texts) > self.max_batch_size:
+                self._carry = request
+                break
+
+            batch.append(request)
+            size += len(request.texts)
+
+        return batch
+
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._collect_batch()
+            # Requests which clients have gone away are not computed
+            batch = [request for request in batch if not request.future.done()]
+            if not batch:
+                continue
+
+            texts = [text for request in batch for text in request.texts]
+            self.batch_sizes.observe(len(texts))
+            self.requests_per_batch.observe(len(batch))
+
+            try:
+                embeddings = await loop.run_in_executor(self._executor, self.handler.embed, texts)
+            except Exception as err:
+                logger.exception("Forward pass of %d texts failed", len(texts))
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(err)
+                continue
+
+            start = 0
+            for request in batch:
+                end = start + len(request.texts)
+                if not request.future.done():
+                    request.future.set_result(embeddings[start:end])
+                start = end
+
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize() + (self._carry is not None),
+            "queue_depth_on_arrival": self.queue_depths.stats,
+            "batch_size": self.batch_sizes.stats,
+            "requests_per_batch": self.requests_per_batch.stats
+        }
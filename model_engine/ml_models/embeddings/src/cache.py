@@ -0,0 +1,331 @@
+"""
+Cache of computed embeddings keyed by model revision and content hash of the text.
+
+Revision is the model name with its backend (look at `emb_model.model_revision`),
+so vectors of the full-precision and quantized models are never mixed.
+
+Two tiers: in-memory LRU of recent vectors and optional on-disk tier that
+survives restarts. On-disk tier of a revision is an append-only memory-mapped
+float32 matrix (one row per text) and a file of sha256 keys of its rows,
+so re-running ingestion computes embeddings only for new chunks.
+"""
+
+import os
+import json
+import asyncio
+import unicodedata
+from hashlib import sha256
+from threading import Lock
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+KEY_SIZE = sha256().digest_size
+
+
+def normalize_text(text: str) -> str:
+    """Texts that differ only by unicode form or whitespace share one embedding"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(revision: str, text: str) -> bytes:
+    return sha256(f"{revision}\0{normalize_text(text)}".encode()).digest()
+
+
+class MemoryTier:
+    """Thread-safe LRU of `maxsize` vectors"""
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._vectors: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: bytes) -> np.ndarray | None:
+        with self._lock:
+            vector = self._vectors.get(key)
+            if vector is not None:
+                self._vectors.move_to_end(key)
+            return vector
+
+    def put(self, key: bytes, vector: np.ndarray) -> None:
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._vectors[key] = vector
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.maxsize:
+                self._vectors.popitem(last = False)
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+
+class DiskTier:
+    """
+    Append-only on-disk vectors of one model revision.
+
+    Files in `directory`:
+        - `{revision}.f32` - rows of little-endian float32;
+        - `{revision}.keys` - key of every row, in the same order;
+        - `{revision}.json` - dimension of vectors.
+
+    Row is written before its key, so every known key has a complete row.
+    When `max_rows` is reached new vectors are not saved anymore.
+    Tier with vectors of other dimension than the new ones is cleared.
+    """
+    def __init__(self, directory: str, revision: str, max_rows: int) -> None:
+        os.makedirs(directory, exist_ok = True)
+        self.data_path = os.path.join(directory, f"{revision}.f32")
+        self.keys_path = os.path.join(directory, f"{revision}.keys")
+        self.meta_path = os.path.join(directory, f"{revision}.json")
+        self.max_rows = max_rows
+
+        self.dim: int | None = None
+        self._rows: dict[bytes, int] = {}
+        self._matrix: np.memmap | None = None
+        self._lock = Lock()
+
+        self._load()
+
+
+    def _load(self) -> None:
+        if not (os.path.exists(self.meta_path) and os.path.exists(self.data_path)):
+            return
+
+        with open(self.meta_path) as meta_file:
+            self.dim = json.load(meta_file)["dim"]
+
+        keys = b""
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "rb") as keys_file:
+                keys = keys_file.read()
+
+        # Keys and rows that were not written completely are cut off,
+        # so new rows are appended right after the known ones
+        rows_on_disk = os.path.getsize(self.data_path) // (self.dim * 4)
+        n_rows = min(len(keys) // KEY_SIZE, rows_on_disk)
+        os.truncate(self.data_path, n_rows * self.dim * 4)
+        if os.path.exists(self.keys_path):
+            os.truncate(self.keys_path, n_rows * KEY_SIZE)
+
+        self._rows = {
+            keys[row * KEY_SIZE:(row + 1) * KEY_SIZE]: row
+            for row in range(n_rows)
+        }
+        logger.info("%d cached embeddings are loaded from %s", n_rows, self.data_path)
+
+
+    def _reset(self, dim: int) -> None:
+        """Drop all rows and start the tier for vectors of `dim`"""
+        self._rows = {}
+        self._matrix = None
+        open(self.data_path, "wb").close()
+        open(self.keys_path, "wb").close()
+
+        self.dim = dim
+        with open(self.meta_path, "w") as meta_file:
+            json.dump({"dim": self.dim}, meta_file)
+
+
+    def _map(self) -> np.memmap | None:
+        """Matrix of all rows, mapped again when file has grown"""
+        if not self._rows:
+            return None
+
+        if self._matrix is None or self._matrix.shape[0] < len(self._rows):
+            self._matrix = np.memmap(
+                self.data_path, dtype = "<f4", mode = "r",
+                shape = (len(self._rows), self.dim)
+            )
+        return self._matrix
+
+
+    def get(self, key: bytes) -> np.ndarray | None:
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            return np.array(self._map()[row])
+
+
+    def put_many(self, items: list[tuple[bytes, np.ndarray]]) -> None:
+        if not items:
+            return
+
+        dim = len(items[0][1])
+        if any(len(vector) != dim for _, vector in items):
+            raise ValueError("Vectors of one batch have different dimensions")
+
+        with self._lock:
+            if self.dim is None:
+                self._reset(dim)
+            elif self.dim != dim:
+                # Rows on disk can't be vectors of this revision, they would be returned as is
+                logger.error(
+                    "Disk cache %s has vectors of dimension %d, new ones have %d, it is cleared",
+                    self.data_path, self.dim, dim
+                )
+                self._reset(dim)
+
+            items = [(key, vector) for key, vector in items if key not in self._rows]
+            items = items[:max(self.max_rows - len(self._rows), 0)]
+            if not items:
+                return
+
+            with open(self.data_path, "ab") as data_file:
+                for _, vector in items:
+                    data_file.write(vector.astype("<f4", copy = False).tobytes())
+                data_file.flush()
+                os.fsync(data_file.fileno())
+
+            with open(self.keys_path, "ab") as keys_file:
+                for key, _ in items:
+                    keys_file.write(key)
+
+            for key, _ in items:
+                self._rows[key] = len(self._rows)
+
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+class EmbeddingsCache:
+    """
+    Arguments
+    ---------
+    memory_size: int
+        Vectors kept in memory, `0` disables memory tier
+    disk_path: str | None
+        Directory of on-disk tier, `None` disables it
+    disk_max_rows: int
+        Maximum number of vectors on disk for every model revision
+    """
+    def __init__(self, memory_size: int, disk_path: str | None, disk_max_rows: int) -> None:
+        self.memory = MemoryTier(memory_size)
+        self.disk_path = disk_path
+        self.disk_max_rows = disk_max_rows
+        self._disks: dict[str, DiskTier] = {}
+        self._disks_lock = Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+
+    def _disk(self, revision: str) -> DiskTier | None:
+        if self.disk_path is None:
+            return None
+
+        # Lookups run in threads, so a tier is never loaded twice
+        with self._disks_lock:
+            if revision not in self._disks:
+                self._disks[revision] = DiskTier(self.disk_path, revision, self.disk_max_rows)
+            return self._disks[revision]
+
+
+    def get(self, revision: str, key: bytes) -> np.ndarray | None:
+        vector = self.memory.get(key)
+        if vector is not None:
+            self.memory_hits += 1
+            return vector
+
+        disk = self._disk(revision)
+        vector = disk.get(key) if disk is not None else None
+        if vector is not None:
+            self.disk_hits += 1
+            self.memory.put(key, vector)
+            return vector
+
+        self.misses += 1
+        return None
+
+
+    def get_many(
+        self, revision: str, texts: list[str]
+    ) -> tuple[list[bytes], dict[bytes, np.ndarray], dict[bytes, str]]:
+        """Keys of `texts`, vectors found in cache and texts missing from it by their keys"""
+        keys = [cache_key(revision, text) for text in texts]
+        found: dict[bytes, np.ndarray] = {}
+        missing: dict[bytes, str] = {}
+
+        for key, text in zip(keys, texts):
+            if key in found or key in missing:
+                continue
+
+            vector = self.get(revision, key)
+            if vector is None:
+                missing[key] = text
+            else:
+                found[key] = vector
+
+        return keys, found, missing
+
+
+    def put_many(self, revision: str, items: list[tuple[bytes, np.ndarray]]) -> None:
+        for key, vector in items:
+            self.memory.put(key, vector)
+
+        disk = self._disk(revision)
+        if disk is not None:
+            try:
+                disk.put_many(items)
+            except OSError as err:
+                logger.warning("Can't save embeddings to disk cache: %s", err)
+
+
+    async def embed(
+        self,
+        revision: Callable[[], str],
+        texts: list[str],
+        compute: Callable[[list[str]], Awaitable[list[list[float]]]]
+    ) -> list[np.ndarray]:
+        """
+        Embeddings of `texts`, only texts that are not in cache are passed to `compute`
+
+        Repeated texts of one call are computed once. `revision` is asked again
+        after `compute`, because a model loaded by it could fall back to other backend.
+        """
+        current_revision = revision()
+        # Disk tier is loaded and read from its memory map, so lookups are done off the event loop too
+        keys, found, missing = await asyncio.to_thread(self.get_many, current_revision, texts)
+
+        if missing:
+            computed = await compute(list(missing.values()))
+            computed_revision = revision()
+            items = [
+                (cache_key(computed_revision, text), np.asarray(vector, dtype = np.float32))
+                for text, vector in zip(missing.values(), computed)
+            ]
+            # Disk tier writes are synced, so they are done off the event loop
+            await asyncio.to_thread(self.put_many, computed_revision, items)
+
+            if computed_revision != current_revision:
+                # Vectors found in cache are of the other revision, so the rest is taken
+                # from the cache of the model that was really loaded
+                logger.warning(
+                    "Embeddings are computed by %s instead of %s", computed_revision, current_revision
+                )
+                return await self.embed(lambda: computed_revision, texts, compute)
+
+            found.update(zip(missing.keys(), (vector for _, vector in items)))
+
+        return [found[key] for key in keys]
+
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_size": len(self.memory),
+            "disk_size": {revision: len(disk) for revision, disk in self._disks.items()}
+        }
@@ -1,6 +1,7 @@
+from langchain_core.embeddings import Embeddings
 from langchain_huggingface.embeddings import HuggingFaceEmbeddings
 
-from gm_services.config import Settings
+from gm_services.config import Settings, EmbeddingsModelSettings
 
 from gm_services.config import EMBEDDINGS_MODEL_TYPE, DEVICE_TYPE
 
@@ -8,12 +9,39 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def model_settings(model_name: EMBEDDINGS_MODEL_TYPE) -> EmbeddingsModelSettings:
+    return Settings.api.embeddings_model.models.get(model_name, EmbeddingsModelSettings())
+
+
+def model_revision(model_name: EMBEDDINGS_MODEL_TYPE) -> str:
+    """
+    Which vectors the model gives when it is loaded: its name and backend.
+    Vectors of different revisions must not be mixed (e.g. in the cache).
+    """
+    settings = model_settings(model_name)
+    if settings.backend == "onnx":
+        from .onnx_backend import read_accuracy_report, check_report, export_dir, AccuracyCheckError
+
+        # Export that didn't pass the accuracy check is replaced by the full-precision model
+        report = read_accuracy_report(export_dir(model_name, settings))
+        try:
+            if report is not None:
+                check_report(model_name, report, settings)
+            return f"{model_name}.onnx-int8"
+        except AccuracyCheckError:
+            pass
+
+    return f"{model_name}.torch"
+
+
 class EmbeddingsHandler:
     def __init__(self, model_name: EMBEDDINGS_MODEL_TYPE) -> None:
         self.model = self._init_embeddings_model(
             model_name = model_name,
             device = Settings.system.device
         )
+        # Export is checked while loading, so now it is known for sure
+        self.revision = model_revision(model_name)
 
     def _match_model_path(
         self, 
@@ -32,8 +60,18 @@ class EmbeddingsHandler:
         self, 
         model_name: EMBEDDINGS_MODEL_TYPE,
         device: DEVICE_TYPE
-    ) -> HuggingFaceEmbeddings:
+    ) -> Embeddings:
         embeddings_name = self._match_model_path(model_name)
+        settings = model_settings(model_name)
+
+        if settings.backend == "onnx":
+            # ONNX Runtime dependencies are needed only for this backend
+            from .onnx_backend import load_onnx_model, AccuracyCheckError
+
+            try:
+                return load_onnx_model(model_name, embeddings_name, settings)
+            except AccuracyCheckError as err:
+                logger.error("%s, full-precision model is used instead", err)
 
         model = HuggingFaceEmbeddings(
             model_name = embeddings_name,
@@ -44,20 +82,3 @@ class EmbeddingsHandler:
     def embed(self, texts: list[str]) -> list[list[float]]:
         result = self.model.embed_documents(texts)
         return result
-
-
-
-def initialize_all_models() -> dict[EMBEDDINGS_MODEL_TYPE, EmbeddingsHandler]:
-    """
-    Create all embeddings instances to be able to get access to all of them
-
-    Currently supports this models:
-        - FRIDA
-    """
-    logger.info("Embedding model: FRIDA")
-    model_frida = EmbeddingsHandler("FRIDA")
-
-    all_embeddings = {
-        "FRIDA": model_frida
-    }
-    return all_embeddings
\ No newline at end of file
@@ -0,0 +1,299 @@
+"""
+ONNX Runtime backend of embeddings models for CPU-only nodes.
+
+Transformer of a sentence-transformers model is exported to ONNX once,
+quantized with dynamic int8 quantization and saved with its tokenizer and
+pooling parameters. Right after export quantized model is compared with
+the full-precision one and rejected if their embeddings differ too much.
+
+Texts of a batch are grouped by token length and every group is padded
+to its length bucket, so short texts don't pay for the longest one and
+ONNX Runtime sees only a few input shapes.
+"""
+
+import os
+import json
+import tempfile
+
+import numpy as np
+import onnxruntime as ort
+from transformers import AutoTokenizer
+from langchain_core.embeddings import Embeddings
+
+from gm_services.config import EmbeddingsModelSettings
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+MODEL_FILE_NAME = "model_quantized.onnx"
+POOLING_FILE_NAME = "pooling.json"
+ACCURACY_FILE_NAME = "accuracy.json"
+
+# Texts for accuracy check, close to what is embedded in production: mail and document chunks
+ACCURACY_CHECK_TEXTS = [
+    "Прошу согласовать проект договора поставки до конца недели.",
+    "Направляем вам протокол совещания по итогам третьего квартала.",
+    "В соответствии с пунктом 4.2 договора оплата производится в течение 10 рабочих дней.",
+    "Кто отвечает за подготовку отчёта о закупках?",
+    "Служебная записка о переносе сроков сдачи проекта",
+    "Please find attached the updated schedule of the working group.",
+    "What is the deadline for submitting the quarterly report?",
+    "Привет",
+    "Настоящим сообщаем, что с 1 января вводятся новые правила документооборота: "
+    "все входящие письма регистрируются в системе в день поступления, "
+    "а ответы на них готовятся не позднее пяти рабочих дней с момента регистрации.",
+]
+
+
+class AccuracyCheckError(Exception):
+    """Quantized model is too far from the full-precision one"""
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Quantized model exported by `export_quantized_model`
+
+    Arguments
+    ---------
+    model_dir: str
+        Directory of the exported model
+    num_threads: int
+        Threads of one forward pass, `0` - all cores
+    length_buckets: list[int]
+        Lengths in tokens to pad texts to, maximum length of the model is always added
+    """
+    def __init__(self, model_dir: str, num_threads: int, length_buckets: list[int]) -> None:
+        with open(os.path.join(model_dir, POOLING_FILE_NAME)) as pooling_file:
+            pooling = json.load(pooling_file)
+        self.pooling_mode: str = pooling["mode"]
+        self.normalize: bool = pooling["normalize"]
+        self.max_length: int = pooling["max_length"]
+
+        self.length_buckets = sorted(
+            {bucket for bucket in length_buckets if bucket < self.max_length} | {self.max_length}
+        )
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        # Batches of one model are run one after another (look at `MicroBatcher`)
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, MODEL_FILE_NAME),
+            sess_options = options,
+            providers = ["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+
+    def _bucket(self, length: int) -> int:
+        return next(bucket for bucket in self.length_buckets if bucket >= length)
+
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        match self.pooling_mode:
+            case "cls":
+                return hidden[:, 0]
+            case "mean":
+                mask = attention_mask[..., None].astype(hidden.dtype)
+                return (hidden * mask).sum(axis = 1) / np.clip(mask.sum(axis = 1), 1e-9, None)
+
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, truncation = True, max_length = self.max_length)
+
+        groups: dict[int, list[int]] = {}
+        for index, input_ids in enumerate(encoded["input_ids"]):
+            groups.setdefault(self._bucket(len(input_ids)), []).append(index)
+
+        embeddings: np.ndarray | None = None
+        for bucket, indices in groups.items():
+            batch = self.tokenizer.pad(
+                {
+                    "input_ids": [encoded["input_ids"][index] for index in indices],
+                    "attention_mask": [encoded["attention_mask"][index] for index in indices]
+                },
+                padding = "max_length",
+                max_length = bucket,
+                return_tensors = "np"
+            )
+            attention_mask = batch["attention_mask"].astype(np.int64)
+            [hidden] = self.session.run(
+                ["last_hidden_state"],
+                {
+                    "input_ids": batch["input_ids"].astype(np.int64),
+                    "attention_mask": attention_mask
+                }
+            )
+            pooled = self._pool(hidden, attention_mask)
+
+            if embeddings is None:
+                embeddings = np.empty((len(texts), pooled.shape[1]), dtype = np.float32)
+            embeddings[indices] = pooled
+
+        if self.normalize:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis = 1, keepdims = True), 1e-12, None)
+        return embeddings
+
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+def _pooling_parameters(model) -> dict:
+    """Pooling of a sentence-transformers model that `OnnxEmbeddings` has to repeat"""
+    from sentence_transformers.models import Pooling, Normalize
+
+    [pooling] = [module for module in model if isinstance(module, Pooling)]
+    if pooling.pooling_mode_cls_token:
+        mode = "cls"
+    elif pooling.pooling_mode_mean_tokens:
+        mode = "mean"
+    else:
+        raise NotImplementedError(f"Pooling {pooling.get_pooling_mode_str()} is not supported")
+
+    return {
+        "mode": mode,
+        "normalize": any(isinstance(module, Normalize) for module in model),
+        "max_length": model.max_seq_length
+    }
+
+
+def check_accuracy(
+    baseline: np.ndarray,
+    candidate: np.ndarray
+) -> dict[str, float]:
+    """Cosine similarity between embeddings of the same texts from two models"""
+    baseline = baseline / np.linalg.norm(baseline, axis = 1, keepdims = True)
+    candidate = candidate / np.linalg.norm(candidate, axis = 1, keepdims = True)
+    similarity = (baseline * candidate).sum(axis = 1)
+    return {
+        "min_cosine_similarity": float(similarity.min()),
+        "mean_cosine_similarity": float(similarity.mean())
+    }
+
+
+def export_quantized_model(
+    model_path: str,
+    model_dir: str,
+    settings: EmbeddingsModelSettings
+) -> dict[str, float]:
+    """
+    Export model to `model_dir`, quantize it and check it against the full-precision model
+
+    Report of the check is saved to `model_dir` whatever the result is, so a rejected
+    export is not repeated on every start (look at `load_onnx_model`).
+
+    Returns
+    -------
+    report: dict[str, float]
+        Result of `check_accuracy`
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    class _Encoder(torch.nn.Module):
+        """Transformer that returns only its last hidden state"""
+        def __init__(self, model: torch.nn.Module) -> None:
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids = input_ids, attention_mask = attention_mask)[0]
+
+    logger.info("Exporting %s to ONNX", model_path)
+    model = SentenceTransformer(model_path, device = "cpu")
+    transformer = model[0]
+    os.makedirs(model_dir, exist_ok = True)
+
+    # Full-precision model could be larger than 2GB and be saved with external data files,
+    # so it is kept in its own directory and removed after quantization
+    with tempfile.TemporaryDirectory(dir = model_dir) as export_dir:
+        full_precision_path = os.path.join(export_dir, "model.onnx")
+        sample = transformer.tokenizer(["export"], return_tensors = "pt")
+        with torch.no_grad():
+            torch.onnx.export(
+                _Encoder(transformer.auto_model).eval(),
+                (sample["input_ids"], sample["attention_mask"]),
+                full_precision_path,
+                input_names = ["input_ids", "attention_mask"],
+                output_names = ["last_hidden_state"],
+                dynamic_axes = {
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "last_hidden_state": {0: "batch", 1: "sequence"}
+                },
+                opset_version = 17
+            )
+
+        quantize_dynamic(
+            full_precision_path,
+            os.path.join(model_dir, MODEL_FILE_NAME),
+            weight_type = QuantType.QInt8
+        )
+
+    transformer.tokenizer.save_pretrained(model_dir)
+    with open(os.path.join(model_dir, POOLING_FILE_NAME), "w") as pooling_file:
+        json.dump(_pooling_parameters(model), pooling_file)
+
+    quantized = OnnxEmbeddings(model_dir, settings.num_threads, settings.length_buckets)
+    report = check_accuracy(
+        baseline = model.encode(ACCURACY_CHECK_TEXTS, convert_to_numpy = True),
+        candidate = quantized.encode(ACCURACY_CHECK_TEXTS)
+    )
+    logger.info("Accuracy of quantized %s: %s", model_path, report)
+
+    with open(os.path.join(model_dir, ACCURACY_FILE_NAME), "w") as accuracy_file:
+        json.dump(report, accuracy_file)
+    return report
+
+
+def read_accuracy_report(model_dir: str) -> dict[str, float] | None:
+    """Report of `export_quantized_model`, `None` if model wasn't exported completely"""
+    try:
+        with open(os.path.join(model_dir, ACCURACY_FILE_NAME)) as accuracy_file:
+            return json.load(accuracy_file)
+    except FileNotFoundError:
+        return None
+
+
+def check_report(model_name: str, report: dict[str, float], settings: EmbeddingsModelSettings) -> None:
+    """Raise `AccuracyCheckError` if exported model is too far from the full-precision one"""
+    if report["min_cosine_similarity"] < settings.min_cosine_similarity:
+        raise AccuracyCheckError(
+            f"Quantized {model_name} has cosine similarity {report['min_cosine_similarity']:.4f} "
+            f"to the full-precision model, {settings.min_cosine_similarity} is required"
+        )
+
+
+def load_onnx_model(
+    model_name: str,
+    model_path: str,
+    settings: EmbeddingsModelSettings
+) -> OnnxEmbeddings:
+    """
+    Load quantized model, export it first if it wasn't exported yet
+
+    Raises `AccuracyCheckError` if the exported model didn't pass the accuracy check.
+    Export is kept with its report, so it is checked again (without exporting)
+    only against a new `min_cosine_similarity`. Remove its directory to export it again.
+    """
+    model_dir = export_dir(model_name, settings)
+    # Accuracy report is written last, so export is complete if it exists
+    report = read_accuracy_report(model_dir)
+    if report is None:
+        report = export_quantized_model(model_path, model_dir, settings)
+
+    check_report(model_name, report, settings)
+    return OnnxEmbeddings(model_dir, settings.num_threads, settings.length_buckets)
+
+
+def export_dir(model_name: str, settings: EmbeddingsModelSettings) -> str:
+    return os.path.join(settings.onnx_path, model_name)
@@ -0,0 +1,203 @@
+"""
+Registry of embeddings models that are loaded on first use.
+
+Loaded models share the RAM budget from config. Before a model is loaded,
+least recently used idle models are unloaded until the expected size of
+the new model fits into the budget. Real size of a model is measured as
+growth of the process memory while it was loading.
+"""
+
+import gc
+import os
+import time
+import asyncio
+from dataclasses import dataclass
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, get_args
+
+from .emb_model import EmbeddingsHandler, model_settings, model_revision
+from .batching import MicroBatcher
+
+from gm_services.config import Settings, EMBEDDINGS_MODEL_TYPE
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+MB = 1024 * 1024
+KNOWN_MODELS: tuple[str, ...] = get_args(EMBEDDINGS_MODEL_TYPE)
+
+
+def _rss_bytes() -> int | None:
+    """Resident memory of the process, `None` if it is not available on this system"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+@dataclass
+class LoadedModel:
+    batcher: MicroBatcher
+    revision: str
+    memory: int
+    load_seconds: float
+    # Requests that are using the model right now, it is not unloaded while they are
+    in_use: int = 0
+
+
+class ModelRegistry:
+    """
+    Arguments
+    ---------
+    memory_budget: int
+        Bytes of RAM for all loaded models
+    """
+    def __init__(self, memory_budget: int) -> None:
+        self.memory_budget = memory_budget
+
+        # Least recently used first
+        self._models: OrderedDict[str, LoadedModel] = OrderedDict()
+        # Models are loaded and unloaded one at a time
+        self._lock = asyncio.Lock()
+
+        self.loads = 0
+        self.unloads = 0
+
+
+    @property
+    def memory_used(self) -> int:
+        return sum(model.memory for model in self._models.values())
+
+
+    async def _free_memory(self, needed: int) -> None:
+        for model_name in list(self._models):
+            if self.memory_used + needed <= self.memory_budget:
+                return
+            if self._models[model_name].in_use == 0:
+                await self._unload(model_name)
+
+        if self.memory_used + needed > self.memory_budget:
+            logger.warning(
+                "Models in use take %d MB, budget of %d MB will be exceeded",
+                self.memory_used // MB, self.memory_budget // MB
+            )
+
+
+    async def _load(self, model_name: EMBEDDINGS_MODEL_TYPE) -> LoadedModel:
+        expected_memory = model_settings(model_name).memory_mb * MB
+        await self._free_memory(expected_memory)
+
+        logger.info("Loading embeddings model %s", model_name)
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        handler = await asyncio.to_thread(EmbeddingsHandler, model_name)
+        load_seconds = time.perf_counter() - started
+        rss_after = _rss_bytes()
+
+        memory = expected_memory
+        if rss_before is not None and rss_after is not None and rss_after > rss_before:
+            memory = rss_after - rss_before
+
+        batcher = MicroBatcher(
+            handler = handler,
+            max_batch_size = Settings.api.embeddings_model.batch_size,
+            max_wait = Settings.api.embeddings_model.max_batch_wait,
+            max_queue_size = Settings.api.embeddings_model.max_queue_size
+        )
+        batcher.start()
+
+        model = LoadedModel(
+            batcher = batcher,
+            revision = handler.revision,
+            memory = memory,
+            load_seconds = load_seconds
+        )
+        self._models[model_name] = model
+        self.loads += 1
+        logger.info("Model %s is loaded in %.1fs, takes %d MB", model_name, load_seconds, memory // MB)
+        return model
+
+
+    async def _unload(self, model_name: str) -> None:
+        model = self._models.pop(model_name)
+        await model.batcher.stop()
+        del model
+        gc.collect()
+
+        self.unloads += 1
+        logger.info("Model %s is unloaded", model_name)
+
+
+    @asynccontextmanager
+    async def use(self, model_name: EMBEDDINGS_MODEL_TYPE) -> AsyncIterator[MicroBatcher]:
+        """Batcher of the model, model is loaded if needed and kept loaded inside the context"""
+        model = self._models.get(model_name)
+        if model is None:
+            async with self._lock:
+                model = self._models.get(model_name)
+                if model is None:
+                    model = await self._load(model_name)
+                model.in_use += 1
+        else:
+            model.in_use += 1
+
+        self._models.move_to_end(model_name)
+        try:
+            yield model.batcher
+        finally:
+            model.in_use -= 1
+
+
+    def revision(self, model_name: EMBEDDINGS_MODEL_TYPE) -> str:
+        """Revision of the model (look at `model_revision`), without loading it"""
+        model = self._models.get(model_name)
+        if model is not None:
+            return model.revision
+        return model_revision(model_name)
+
+
+    async def embed(self, model_name: EMBEDDINGS_MODEL_TYPE, texts: list[str]) -> list[list[float]]:
+        async with self.use(model_name) as batcher:
+            return await batcher.embed(texts)
+
+
+    async def warm_up(self, model_name: EMBEDDINGS_MODEL_TYPE) -> dict:
+        """Load the model and run one forward pass, so the first request doesn't wait for it"""
+        async with self.use(model_name) as batcher:
+            await batcher.embed(["warm-up"])
+        return self.model_stats(model_name)
+
+
+    async def close(self) -> None:
+        async with self._lock:
+            for model_name in list(self._models):
+                await self._unload(model_name)
+
+
+    def model_stats(self, model_name: str) -> dict:
+        model = self._models.get(model_name)
+        if model is None:
+            return {"loaded": False}
+
+        return {
+            "loaded": True,
+            "revision": model.revision,
+            "memory_mb": model.memory // MB,
+            "load_seconds": model.load_seconds,
+            "in_use": model.in_use,
+            **model.batcher.stats
+        }
+
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "memory_used_mb": self.memory_used // MB,
+            "memory_budget_mb": self.memory_budget // MB,
+            "loads": self.loads,
+            "unloads": self.unloads,
+            "models": {model_name: self.model_stats(model_name) for model_name in KNOWN_MODELS}
+        }
@@ -0,0 +1,49 @@
+import os
+import sys
+import threading
+
+import pytest
+
+# Service is imported as `src` package from its own directory (look at main.py).
+# Tests are run from the repository root, where `config/config.yaml` is
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+class FakeModel:
+    """Embedding of a text is its length, forward passes are recorded"""
+    def __init__(self) -> None:
+        self.revision = "FRIDA.torch"
+        self.fail = False
+        self.batches: list[list[str]] = []
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        self.batches.append(list(texts))
+        if self.fail:
+            raise RuntimeError("forward pass failed")
+        return [[float(len(text))] for text in texts]
+
+    async def compute(self, texts: list[str]) -> list[list[float]]:
+        return self.embed(texts)
+
+
+class BlockingModel(FakeModel):
+    """Forward pass waits until it is released, so requests pile up in the queue"""
+    def __init__(self) -> None:
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        self.started.set()
+        self.release.wait(timeout = 5)
+        return super().embed(texts)
+
+
+@pytest.fixture
+def model() -> FakeModel:
+    return FakeModel()
+
+
+@pytest.fixture
+def blocking_model() -> BlockingModel:
+    return BlockingModel()
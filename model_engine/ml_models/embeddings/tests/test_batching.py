@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from src.batching import MicroBatcher, QueueFullError
+
+
+def run(model, scenario, **kwargs):
+    async def main():
+        batcher = MicroBatcher(
+            handler = model,
+            max_batch_size = kwargs.get("max_batch_size", 8),
+            max_wait = kwargs.get("max_wait", 0.05),
+            max_queue_size = kwargs.get("max_queue_size", 16)
+        )
+        try:
+            return await scenario(batcher)
+        finally:
+            await batcher.stop()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_share_forward_pass(model):
+    async def scenario(batcher: MicroBatcher):
+        return await asyncio.gather(
+            batcher.embed(["a", "bb"]),
+            batcher.embed(["ccc"]),
+            batcher.embed(["dddd", "eeeee"])
+        )
+
+    results = run(model, scenario)
+
+    assert model.batches == [["a", "bb", "ccc", "dddd", "eeeee"]]
+    assert results == [[[1.0], [2.0]], [[3.0]], [[4.0], [5.0]]]
+
+
+def test_request_that_does_not_fit_goes_to_next_batch(model):
+    async def scenario(batcher: MicroBatcher):
+        return await asyncio.gather(
+            batcher.embed(["a", "b", "c"]),
+            batcher.embed(["d", "e"]),
+            batcher.embed(["f"])
+        )
+
+    results = run(model, scenario, max_batch_size = 4)
+
+    # Requests are never split, the second one waits for the next forward pass
+    assert model.batches == [["a", "b", "c"], ["d", "e", "f"]]
+    assert results == [[[1.0]] * 3, [[1.0]] * 2, [[1.0]]]
+
+
+def test_forward_pass_error_is_raised_for_every_request(model):
+    model.fail = True
+
+    async def scenario(batcher: MicroBatcher):
+        return await asyncio.gather(
+            batcher.embed(["a"]),
+            batcher.embed(["b"]),
+            return_exceptions = True
+        )
+
+    results = run(model, scenario)
+
+    assert len(model.batches) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_worker_survives_failed_forward_pass(model):
+    model.fail = True
+
+    async def scenario(batcher: MicroBatcher):
+        with pytest.raises(RuntimeError):
+            await batcher.embed(["a"])
+        model.fail = False
+        return await batcher.embed(["bb"])
+
+    assert run(model, scenario) == [[2.0]]
+
+
+def test_full_queue_is_rejected(blocking_model):
+    async def scenario(batcher: MicroBatcher):
+        first = asyncio.create_task(batcher.embed(["a"]))
+        # Worker is busy with the first request, the second one waits in the queue
+        await asyncio.to_thread(blocking_model.started.wait, 5)
+        second = asyncio.create_task(batcher.embed(["b"]))
+        await asyncio.sleep(0)
+
+        with pytest.raises(QueueFullError):
+            await batcher.embed(["c"])
+
+        blocking_model.release.set()
+        return await asyncio.gather(first, second)
+
+    assert run(blocking_model, scenario, max_queue_size = 1) == [[[1.0]], [[1.0]]]
+
+
+def test_empty_request_is_not_queued(model):
+    async def scenario(batcher: MicroBatcher):
+        return await batcher.embed([])
+
+    assert run(model, scenario) == []
+    assert model.batches == []
+
+
+def test_stats(model):
+    async def scenario(batcher: MicroBatcher):
+        await asyncio.gather(batcher.embed(["a", "b"]), batcher.embed(["c"]))
+        return batcher.stats
+
+    stats = run(model, scenario)
+
+    assert stats["queue_depth"] == 0
+    assert stats["batch_size"]["count"] == 1
+    assert stats["batch_size"]["sum"] == 3
+    assert stats["requests_per_batch"]["sum"] == 2
@@ -0,0 +1,173 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+from src.cache import KEY_SIZE, DiskTier, EmbeddingsCache, MemoryTier, cache_key
+
+
+def vector(*values: float) -> np.ndarray:
+    return np.array(values, dtype = np.float32)
+
+
+def embed(cache: EmbeddingsCache, model, texts: list[str]) -> list[np.ndarray]:
+    return asyncio.run(cache.embed(lambda: model.revision, texts, model.compute))
+
+
+# ---------
+# Cache key
+# ---------
+def test_key_ignores_whitespace_and_unicode_form():
+    composed = "Привет,  мир \u0439"
+    decomposed = "Привет, мир\nи\u0306"
+
+    assert cache_key("FRIDA.torch", composed) == cache_key("FRIDA.torch", decomposed)
+    assert len(cache_key("FRIDA.torch", composed)) == KEY_SIZE
+
+
+def test_key_depends_on_text_and_revision():
+    assert cache_key("FRIDA.torch", "text") != cache_key("FRIDA.torch", "other text")
+    assert cache_key("FRIDA.torch", "text") != cache_key("FRIDA.onnx-int8", "text")
+    assert cache_key("FRIDA.torch", "text") != cache_key("e5-large.torch", "text")
+
+
+# -----------
+# Memory tier
+# -----------
+def test_memory_tier_evicts_least_recently_used():
+    memory = MemoryTier(maxsize = 2)
+    memory.put(b"first", vector(1))
+    memory.put(b"second", vector(2))
+    memory.get(b"first")
+    memory.put(b"third", vector(3))
+
+    assert memory.get(b"second") is None
+    assert memory.get(b"first") is not None
+    assert len(memory) == 2
+
+
+# ---------
+# Disk tier
+# ---------
+def test_disk_tier_survives_restart(tmp_path):
+    disk = DiskTier(str(tmp_path), "FRIDA.torch", max_rows = 10)
+    disk.put_many([(b"a" * KEY_SIZE, vector(1, 2)), (b"b" * KEY_SIZE, vector(3, 4))])
+
+    disk = DiskTier(str(tmp_path), "FRIDA.torch", max_rows = 10)
+
+    assert len(disk) == 2
+    assert disk.dim == 2
+    np.testing.assert_array_equal(disk.get(b"b" * KEY_SIZE), vector(3, 4))
+    assert disk.get(b"c" * KEY_SIZE) is None
+
+
+def test_disk_tiers_of_revisions_are_separate(tmp_path):
+    DiskTier(str(tmp_path), "FRIDA.torch", max_rows = 10).put_many([(b"a" * KEY_SIZE, vector(1, 2))])
+
+    assert len(DiskTier(str(tmp_path), "FRIDA.onnx-int8", max_rows = 10)) == 0
+
+
+def test_disk_tier_cuts_off_torn_write(tmp_path):
+    disk = DiskTier(str(tmp_path), "FRIDA.torch", max_rows = 10)
+    disk.put_many([(b"a" * KEY_SIZE, vector(1, 2))])
+    # Row of the next vector was written only partly and its key not at all
+    with open(disk.data_path, "ab") as data_file:
+        data_file.write(vector(5, 6).tobytes()[:6])
+
+    disk = DiskTier(str(tmp_path), "FRIDA.torch", max_rows = 10)
+    disk.put_many([(b"b" * KEY_SIZE, vector(3, 4))])
+
+    assert len(disk) == 2
+    assert os.path.getsize(disk.data_path) == 2 * 2 * 4
+    np.testing.assert_array_equal(disk.get(b"b" * KEY_SIZE), vector(3, 4))
+
+
+def test_disk_tier_stops_at_max_rows(tmp_path):
+    disk = DiskTier(str(tmp_path), "FRIDA.torch", max_rows = 2)
+    disk.put_many([(bytes([i]) * KEY_SIZE, vector(i, i)) for i in range(3)])
+
+    assert len(disk) == 2
+    assert disk.get(bytes([2]) * KEY_SIZE) is None
+
+
+def test_disk_tier_of_other_dimension_is_cleared(tmp_path):
+    disk = DiskTier(str(tmp_path), "FRIDA.torch", max_rows = 10)
+    disk.put_many([(b"a" * KEY_SIZE, vector(1, 2))])
+
+    disk = DiskTier(str(tmp_path), "FRIDA.torch", max_rows = 10)
+    disk.put_many([(b"b" * KEY_SIZE, vector(1, 2, 3))])
+
+    assert disk.dim == 3
+    assert disk.get(b"a" * KEY_SIZE) is None
+    np.testing.assert_array_equal(disk.get(b"b" * KEY_SIZE), vector(1, 2, 3))
+
+    disk = DiskTier(str(tmp_path), "FRIDA.torch", max_rows = 10)
+    assert len(disk) == 1
+    assert disk.dim == 3
+
+
+# -----------------
+# Cache of requests
+# -----------------
+def test_only_missing_texts_are_computed(tmp_path, model):
+    cache = EmbeddingsCache(memory_size = 100, disk_path = str(tmp_path), disk_max_rows = 100)
+
+    embed(cache, model, ["a", "bb"])
+    result = embed(cache, model, ["bb", "ccc", " a "])
+
+    assert model.batches == [["a", "bb"], ["ccc"]]
+    assert [float(vector[0]) for vector in result] == [2.0, 3.0, 1.0]
+    assert cache.stats["misses"] == 3
+
+
+def test_repeated_texts_are_computed_once(tmp_path, model):
+    cache = EmbeddingsCache(memory_size = 100, disk_path = None, disk_max_rows = 100)
+
+    result = embed(cache, model, ["a", "a", "bb", "a"])
+
+    assert model.batches == [["a", "bb"]]
+    assert [float(vector[0]) for vector in result] == [1.0, 1.0, 2.0, 1.0]
+
+
+def test_disk_tier_is_used_after_restart(tmp_path, model):
+    embed(EmbeddingsCache(100, str(tmp_path), 100), model, ["a", "bb"])
+
+    cache = EmbeddingsCache(100, str(tmp_path), 100)
+    embed(cache, model, ["a", "bb"])
+
+    assert model.batches == [["a", "bb"]]
+    assert cache.stats["disk_hits"] == 2
+
+
+def test_vectors_of_other_revision_are_not_used(tmp_path, model):
+    cache = EmbeddingsCache(memory_size = 100, disk_path = str(tmp_path), disk_max_rows = 100)
+    embed(cache, model, ["a"])
+
+    model.revision = "FRIDA.onnx-int8"
+    embed(cache, model, ["a"])
+
+    assert model.batches == [["a"], ["a"]]
+    assert set(cache.stats["disk_size"]) == {"FRIDA.torch", "FRIDA.onnx-int8"}
+
+
+def test_vectors_are_saved_under_revision_that_computed_them(tmp_path, model):
+    cache = EmbeddingsCache(memory_size = 100, disk_path = str(tmp_path), disk_max_rows = 100)
+    embed(cache, model, ["a"])
+
+    # Model was expected to load as int8 export, but fell back to full precision
+    model.revision = "FRIDA.onnx-int8"
+    compute = model.compute
+
+    async def compute_with_fallback(texts: list[str]) -> list[list[float]]:
+        model.revision = "FRIDA.torch"
+        return await compute(texts)
+
+    model.compute = compute_with_fallback
+    result = embed(cache, model, ["a", "bb"])
+
+    # "a" is taken from cache of the model that really computed "bb"
+    assert model.batches == [["a"], ["a", "bb"]]
+    assert [float(vector[0]) for vector in result] == [1.0, 2.0]
+    assert cache.stats["disk_size"]["FRIDA.torch"] == 2
+    assert cache.stats["disk_size"].get("FRIDA.onnx-int8", 0) == 0